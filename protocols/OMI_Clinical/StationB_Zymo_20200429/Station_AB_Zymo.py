@@ -0,0 +1,453 @@
+import math
+
+from opentrons import types
+
+from checkpoint import Checkpoint
+from liquid import LiquidTracker
+from mixing import MixingStage
+from scheduler import IncubationScheduler
+from supernatant import SupernatantRemoval
+from tracing import trace
+
+metadata = {
+    'protocolName': 'Zymo Quick-DNA/RNA MagBead Station B',
+    'author': 'Chaz <chaz@opentrons.com>',
+    'source': 'Covid-19 Diagnostics',
+    'apiLevel': '2.2'
+}
+
+# Up to 48 samples, in every other column of the deepwell plate, as in the
+# 24- and 48-sample scripts next to this one.  python tools/sweep.py writes
+# a copy of this script for any sample count and compares their throughput.
+NUM_SAMPLES = 48
+
+# Set to 2 to run a second plate of NUM_SAMPLES (at most 24) after the
+# first.  It waits in slot 7, and the p20 adds its proteinase K while the
+# first plate incubates (see tools/scheduler.py).  After the first plate
+# the robot pauses for the second to go on the magnet, fresh tips and a
+# fresh trough.  python tools/runtime.py puts two plates of 24 at 208:36,
+# about 11 minutes less than two 24-sample runs (2 x 109:40), not counting
+# the operator.  One 48-sample run is faster still, at 179:58, so use two
+# plates only when the second batch isn't ready at the start.
+PLATES = 1
+# Whether the p20 also adds the next plate's internal extraction control
+# during incubations.  That puts it in before the viral buffer instead of
+# after, so only turn it on if your validation allows that order.
+PREADD_IEC = False
+# Set to False to run the same steps strictly in sequence, for comparison.
+OVERLAP_INCUBATIONS = True
+# Estimated seconds for the p20 to add a reagent to a column of 8 wells:
+# python tools/runtime.py puts 'Adding Proteinase K' at 2:29 a column.
+P20_COLUMN_SECONDS = 150
+
+# Where the run records its progress.  /data/user_storage on the robot
+# survives restarts; see tools/checkpoint.py.
+CHECKPOINT_FILE = '/data/user_storage/checkpoints/Station_AB_Zymo.json'
+# After an interrupted run, set RESUME = True to skip whatever it finished.
+# To restart at a particular step instead, set RESUME_FROM to its name,
+# e.g. 'Wash 2', or 'Wash 2 (plate 2)' for the second plate.
+RESUME = False
+RESUME_FROM = None
+
+# Where the run records how long each phase and pipette command takes, to
+# compare with the estimate: python tools/tracing.py <this script> <file>.
+TRACE_FILE = '/data/user_storage/traces/Station_AB_Zymo.jsonl'
+
+# Aspirate from the trough just below the liquid surface, following it down,
+# and faster while the tip is well clear of the bottom; see tools/liquid.py.
+# Resumed runs aspirate from the bottom, as the troughs may hold less than
+# a full run draws.
+LIQUID_TRACKING = True
+
+# uL of sample in each well of the plate from Station A.
+SAMPLE_VOLUME = 200
+# How many times each mix turns over the well's contents (cycles x mix
+# volume / well volume); tools/mixing.py picks the cycles and flow rates.
+# These match the hand-tuned 180 uL mixes they replaced; lower them to
+# trim mixing that buys nothing.
+MIX_TURNOVERS = {
+    'Viral buffer': 1.3,
+    'Bead mixing': 5.2,
+    'Wash 1': 6.9,
+    'Wash 2': 3.3,
+    'Wash 3': 3.3,
+    'Wash 4': 3.3,
+}
+
+
+def run(protocol):
+    if not 1 <= NUM_SAMPLES <= 48:
+        raise ValueError('NUM_SAMPLES must be between 1 and 48')
+    if PLATES not in (1, 2):
+        raise ValueError('PLATES must be 1 or 2')
+    if PLATES == 2 and NUM_SAMPLES > 24:
+        raise ValueError(
+            'Two plates need NUM_SAMPLES of 24 or fewer, to leave a slot '
+            'for the second plate')
+
+    tracer = trace(protocol, TRACE_FILE, metadata['protocolName'])
+    try:
+        run_steps(protocol)
+    finally:
+        tracer.close()
+
+
+def run_steps(protocol):
+    num_cols = math.ceil(NUM_SAMPLES/8)
+
+    # load labware and pipettes
+    # Ten sets of num_cols tip columns, one per step, as few racks as fit.
+    # A second plate reuses the same tips after the racks are replaced.
+    tipracks = [
+        protocol.load_labware('opentrons_96_tiprack_300ul', slot)
+        for slot in ['1', '6', '9', '7', '10'][:math.ceil(10*num_cols/12)]]
+    tipcols = [rack['A'+str(i)] for rack in tipracks for i in range(1, 13)]
+    tips20 = protocol.load_labware('opentrons_96_filtertiprack_20ul', '5')
+    (tips1, tips2, tips3, tips4, tips5,
+     tips6, tips7, tips8, tips9, tips10) = [
+        tipcols[i*num_cols:(i+1)*num_cols] for i in range(10)]
+
+    p300 = protocol.load_instrument(
+        'p300_multi_gen2', 'left')
+
+    p20 = protocol.load_instrument(
+        'p20_single_gen2', 'right', tip_racks=[tips20])
+
+    magdeck = protocol.load_module('magdeck', '4')
+    magheight = 13.7
+    magplate = magdeck.load_labware('nest_96_deepwell_2ml')
+    if PLATES == 2:
+        nextplate = protocol.load_labware(
+            'nest_96_deepwell_2ml', '7', 'Second Sample Plate')
+    tempdeck = protocol.load_module('tempdeck', '3')
+    tempdeck.set_temperature(6)
+    flatplate = tempdeck.load_labware(
+                'opentrons_96_aluminumblock_nest_wellplate_100ul',)
+    liqwaste2 = protocol.load_labware(
+                'nest_1_reservoir_195ml', '11', 'Liquid Waste')
+    waste2 = liqwaste2['A1'].top()
+    tuberack = protocol.load_labware(
+        'opentrons_24_tuberack_eppendorf_1.5ml_safelock_snapcap',
+        '8', 'Opentrons 24 TubeRack')
+    trough = protocol.load_labware(
+                    'nest_12_reservoir_15ml', '2', 'Trough with Reagents')
+    # Each trough well holds buffer for two columns, or wash for three.
+    buffer = [trough['A'+str(1+i//2)] for i in range(num_cols)]
+    wb1 = [trough['A'+str(4+i//3)] for i in range(num_cols)]
+    wb2 = [trough['A'+str(6+i//3)] for i in range(num_cols)]
+    ethanol1 = [trough['A'+str(8+i//3)] for i in range(num_cols)]
+    ethanol2 = [trough['A'+str(10+i//3)] for i in range(num_cols)]
+    water = trough['A12']
+    pk = tuberack['D1']
+    iec = tuberack['D4']
+
+    magsamps = [magplate['A'+str(i)] for i in range(1, 2*num_cols, 2)]
+
+    def sample_wells(plate):
+        return [
+            well for pl in plate.columns()[:2*num_cols:2]
+            for well in pl][:NUM_SAMPLES]
+
+    checkpoint = Checkpoint(
+        protocol, CHECKPOINT_FILE, resume=RESUME, resume_from=RESUME_FROM)
+    checkpoint.track(*tipracks, tips20)
+
+    def fill_trough():
+        liquid = LiquidTracker()
+        if LIQUID_TRACKING and not RESUME and RESUME_FROM is None:
+            # What each column draws from its trough well, per channel.
+            # Not the bead buffer: the beads settle, so it is drawn from
+            # the bottom.
+            for wells, volume in [
+                    (wb1, 495), (wb2, 495),
+                    (ethanol1, 495), (ethanol2, 495),
+                    ([water] * num_cols, 50)]:
+                for well in wells:
+                    liquid.add(well, 8 * volume)
+        return liquid
+
+    liquid = fill_trough()
+
+    p300.flow_rate.aspirate = 50
+    p300.flow_rate.dispense = 150
+    p300.flow_rate.blow_out = 300
+
+    mixer = MixingStage(protocol, p300)
+    scheduler = IncubationScheduler(protocol, overlap=OVERLAP_INCUBATIONS)
+
+    def well_mix(stage, loc, vol):
+        loc1 = loc.bottom().move(types.Point(x=1, y=0, z=0.6))
+        loc2 = loc.bottom().move(types.Point(x=1, y=0, z=5.5))
+        mixer.mix(stage, loc1, loc2, vol, MIX_TURNOVERS[stage])
+
+    def p20_add(reagent, wells):
+        for well in wells:
+            p20.pick_up_tip()
+            p20.aspirate(4, reagent.bottom(0.5))
+            p20.dispense(4, well)
+            p20.blow_out()
+            p20.drop_tip()
+
+    # The second plate's p20 additions, a column at a time so they fit in
+    # the first plate's incubations.  Each well is recorded in the
+    # checkpoint as it is done, so a resumed run doesn't add it twice.
+    next_plate_tasks = []
+
+    def add_next_plate_task(name, reagent, wells):
+        def action():
+            if not checkpoint.finished(name):
+                p20_add(reagent, checkpoint.progress(wells, name))
+                checkpoint.record(name)
+        next_plate_tasks.append(
+            scheduler.add(name, action, P20_COLUMN_SECONDS))
+
+    if PLATES == 2:
+        reagents = [('Proteinase K', pk)]
+        if PREADD_IEC:
+            reagents.append(('Internal extraction control', iec))
+        for name, reagent in reagents:
+            for i in range(num_cols):
+                add_next_plate_task(
+                    '{} (plate 2, column {})'.format(name, i + 1), reagent,
+                    sample_wells(nextplate)[8*i:8*i+8])
+
+    # Step 5 - Remove supernatant
+    remover = SupernatantRemoval(
+        protocol, p300, capacity=270, air_gap=10, baseline_trip=180)
+
+    # The incubations in each step, in minutes.  A step that a resumed run
+    # skips passes them to scheduler.skip(), so the second plate's tasks a
+    # full run would have done in them aren't done again.
+    incubations = {
+        'Binding supernatant removal': [5],
+        'Wash 1': [3],
+        'Wash 2': [3],
+        'Wash 3': [3],
+        'Wash 4': [3],
+        'Ethanol removal': [2, 10],
+        'Elution': [2],
+        'Elution transfer': [4],
+    }
+
+    def supernatant_removal(stage, vol, src, dest):
+        p300.flow_rate.aspirate = 20
+        remover.remove(
+            stage, src.bottom().move(types.Point(x=-1, y=0, z=0.5)), dest, vol)
+        p300.flow_rate.aspirate = 50
+
+    def process_plate(plate):
+        """Run every step on the plate on the magnet.  plate counts from 0."""
+        elutes = [
+            flatplate['A'+str(i)]
+            for i in range(plate*num_cols + 1, (plate+1)*num_cols + 1)]
+
+        def step(name):
+            label = name
+            if plate:
+                label = '{} (plate {})'.format(name, plate + 1)
+            if checkpoint.step(label):
+                return True
+            scheduler.skip(*[60 * m for m in incubations.get(name, [])])
+            return False
+
+        # Add proteinase k
+        if not plate and step('Proteinase K'):
+            protocol.comment('Adding Proteinase K to each well:')
+            p20_add(pk, checkpoint.progress(sample_wells(magplate)))
+            checkpoint.done()
+
+        # transfer 800ul of buffer
+        if step('Viral buffer'):
+            protocol.comment('Adding viral buffer + beads to samples:')
+            for well, reagent, tip in checkpoint.progress(
+                    zip(magsamps, buffer, tips1)):
+                p300.pick_up_tip(tip)
+                for _ in range(4):
+                    p300.aspirate(160, reagent)
+                    p300.dispense(160, well.top(-5))
+                    p300.aspirate(10, well.top(-5))
+                p300.aspirate(160, reagent)
+                p300.dispense(200, well.top(-10))
+                well_mix('Viral buffer', well, SAMPLE_VOLUME + 804)
+                p300.aspirate(20, well.top(-5))
+                p300.drop_tip()
+            checkpoint.done()
+
+        # Add internal extraction control
+        if not (plate and PREADD_IEC) and step('Internal extraction control'):
+            protocol.comment('Adding Internal Extraction Control to each well:')
+            p20_add(iec, checkpoint.progress(sample_wells(magplate)))
+            checkpoint.done()
+
+        # mix magbeads for 10 minutes
+        if step('Bead mixing'):
+            protocol.comment('Mixing samples+buffer+beads:')
+            for well, tip in checkpoint.progress(zip(magsamps, tips2)):
+                p300.pick_up_tip(tip)
+                well_mix('Bead mixing', well, SAMPLE_VOLUME + 808)
+                p300.blow_out()
+                p300.return_tip()
+            checkpoint.done()
+
+        if step('Binding supernatant removal'):
+            magdeck.engage(height=magheight)
+            minutes, = incubations['Binding supernatant removal']
+            scheduler.incubate(
+                minutes=minutes,
+                msg='Incubating on magdeck for {} minutes'.format(minutes))
+
+            protocol.comment('Removing supernatant:')
+
+            for well, tip in checkpoint.progress(zip(magsamps, tips2)):
+                p300.pick_up_tip(tip)
+                supernatant_removal('Binding 1', 520, well, waste2)
+                p300.drop_tip()
+
+            for well, tip in checkpoint.progress(zip(magsamps, tips3)):
+                p300.pick_up_tip(tip)
+                supernatant_removal('Binding 2', 700, well, waste2)
+                p300.drop_tip()
+
+            magdeck.disengage()
+            checkpoint.done()
+
+        def wash_step(src, stage, tips, wasteman, msg, trash_tips=True):
+            protocol.comment(f'Wash Step {msg} - Adding to samples:')
+            for well, tip, s in checkpoint.progress(zip(magsamps, tips, src)):
+                p300.pick_up_tip(tip)
+                for _ in range(2):
+                    liquid.aspirate(p300, 165, s)
+                    p300.dispense(165, well.top(-3))
+                    p300.aspirate(10, well.top(-3))
+                liquid.aspirate(p300, 165, s)
+                p300.dispense(185, well.bottom(5))
+                well_mix(stage, well, 495)
+                p300.blow_out()
+                p300.return_tip()
+
+            magdeck.engage(height=magheight)
+            minutes, = incubations[stage]
+            scheduler.incubate(
+                minutes=minutes,
+                msg='Incubating on MagDeck for {} minutes.'.format(minutes))
+
+            protocol.comment(f'Removing supernatant from Wash {msg}:')
+            for well, tip in checkpoint.progress(zip(magsamps, tips)):
+                p300.pick_up_tip(tip)
+                supernatant_removal(stage, 495, well, wasteman)
+                if trash_tips:
+                    p300.drop_tip()
+                else:
+                    p300.return_tip()
+            magdeck.disengage()
+
+        if step('Wash 1'):
+            wash_step(wb1, 'Wash 1', tips4, waste2, '1 Wash Buffer 1')
+            checkpoint.done()
+
+        if step('Wash 2'):
+            wash_step(wb2, 'Wash 2', tips5, waste2, '2 Wash Buffer 2')
+            checkpoint.done()
+
+        if step('Wash 3'):
+            wash_step(ethanol1, 'Wash 3', tips6, waste2, '3 Ethanol 1')
+            checkpoint.done()
+
+        if step('Wash 4'):
+            wash_step(ethanol2, 'Wash 4', tips7, waste2, '4 Ethanol 2')
+            checkpoint.done()
+
+        if step('Ethanol removal'):
+            before, after = incubations['Ethanol removal']
+            scheduler.incubate(
+                minutes=before,
+                msg='Allowing beads to air dry for {} minutes.'.format(before))
+
+            p300.flow_rate.aspirate = 20
+            protocol.comment('Removing any excess ethanol from wells:')
+            for well, tip in checkpoint.progress(zip(magsamps, tips8)):
+                p300.pick_up_tip(tip)
+                p300.transfer(
+                    180, well.bottom().move(types.Point(x=-0.5, y=0, z=0.4)),
+                    waste2, new_tip='never')
+                p300.drop_tip()
+            p300.flow_rate.aspirate = 50
+
+            scheduler.incubate(
+                minutes=after,
+                msg='Allowing beads to air dry for {} minutes.'.format(after))
+
+            magdeck.disengage()
+            checkpoint.done()
+
+        if step('Elution'):
+            protocol.comment('Adding NF-Water to wells for elution:')
+            for well, tip in checkpoint.progress(zip(magsamps, tips9)):
+                p300.pick_up_tip(tip)
+                p300.aspirate(20, water.top())
+                liquid.aspirate(p300, 50, water)
+                for _ in range(15):
+                    p300.dispense(
+                        40, well.bottom().move(types.Point(x=1, y=0, z=2)))
+                    p300.aspirate(
+                        40, well.bottom().move(types.Point(x=1, y=0, z=0.5)))
+                p300.dispense(70, well)
+                p300.blow_out()
+                p300.drop_tip()
+
+            minutes, = incubations['Elution']
+            scheduler.incubate(
+                minutes=minutes,
+                msg='Incubating at room temp for {} minutes.'.format(minutes))
+            checkpoint.done()
+
+        # Step 21 - Transfer elutes to clean plate
+        if step('Elution transfer'):
+            magdeck.engage(height=magheight)
+            minutes, = incubations['Elution transfer']
+            scheduler.incubate(
+                minutes=minutes,
+                msg='Incubating on MagDeck for {} minutes.'.format(minutes))
+
+            protocol.comment('Transferring elution to final plate:')
+            p300.flow_rate.aspirate = 10
+            for src, dest, tip in checkpoint.progress(
+                    zip(magsamps, elutes, tips10)):
+                p300.pick_up_tip(tip)
+                p300.aspirate(
+                    50, src.bottom().move(types.Point(x=-0.8, y=0, z=0.6)))
+                p300.dispense(50, dest)
+                p300.drop_tip()
+            p300.flow_rate.aspirate = 50
+
+            magdeck.disengage()
+            checkpoint.done()
+
+    process_plate(0)
+
+    if PLATES == 2:
+        if checkpoint.step('Load plate 2'):
+            # Whatever didn't fit in an incubation is done while the
+            # second plate is still in slot 7.
+            for task in next_plate_tasks:
+                scheduler.require(task)
+            protocol.pause(
+                'Move the plate in slot 7 onto the magnetic module, put '
+                'fresh tip racks in slots {}, replace the trough with a '
+                'full one and empty the trash, then resume.'.format(
+                    ', '.join(rack.parent for rack in tipracks)))
+            for rack in tipracks:
+                rack.reset()
+            liquid = fill_trough()
+            checkpoint.done()
+        else:
+            # The second plate is already on the magnet, and slot 7 empty.
+            for task in next_plate_tasks:
+                scheduler.cancel(task)
+            liquid = LiquidTracker()
+        process_plate(1)
+        scheduler.report()
+
+    mixer.report()
+    remover.report()
+    protocol.comment('Congratulations!')
@@ -1,5 +1,7 @@
 from opentrons import types
 
+from checkpoint import Checkpoint
+
 metadata = {
     'protocolName': 'Zymo Quick-DNA/RNA MagBead Station B 24 Samples',
     'author': 'Chaz <chaz@opentrons.com>',
@@ -7,6 +9,15 @@ metadata = {
     'apiLevel': '2.2'
 }
 
+# Where the run records its progress.  /data/user_storage on the robot
+# survives restarts; see tools/checkpoint.py.
+CHECKPOINT_FILE = '/data/user_storage/checkpoints/Station_AB_Zymo_24samples.json'
+# After an interrupted run, set RESUME = True to skip whatever it finished.
+# To restart at a particular step instead, set RESUME_FROM to its name,
+# e.g. 'Wash 2'.
+RESUME = False
+RESUME_FROM = None
+
 
 def run(protocol):
 
@@ -60,6 +71,10 @@ def run(protocol):
     magsamps24 = [well for pl in magplate.columns()[:6:2] for well in pl]
     elutes = [flatplate['A'+str(i)] for i in range(1, 4)]
 
+    checkpoint = Checkpoint(
+        protocol, CHECKPOINT_FILE, resume=RESUME, resume_from=RESUME_FROM)
+    checkpoint.track(tr1, tr2, tips_single, tips20)
+
     p300.flow_rate.aspirate = 50
     p300.flow_rate.dispense = 150
     p300.flow_rate.blow_out = 300
@@ -74,48 +89,53 @@ def run(protocol):
         p300.dispense(20, loc2)
 
     # Add proteinase k
-    protocol.comment('Adding Proteinase K to each well:')
-    for well in magsamps24:
-        p20.pick_up_tip()
-        p20.aspirate(4, pk.bottom(0.5))
-        p20.dispense(4, well)
-        p20.blow_out()
-        p20.drop_tip()
+    if checkpoint.step('Proteinase K'):
+        protocol.comment('Adding Proteinase K to each well:')
+        for well in checkpoint.progress(magsamps24):
+            p20.pick_up_tip()
+            p20.aspirate(4, pk.bottom(0.5))
+            p20.dispense(4, well)
+            p20.blow_out()
+            p20.drop_tip()
+        checkpoint.done()
 
     # transfer 800ul of buffer
-    protocol.comment('Adding viral buffer + beads to samples:')
-    for well, reagent, tip in zip(magsamps, buffer, tips1):
-        p300.pick_up_tip(tip)
-        for _ in range(4):
+    if checkpoint.step('Viral buffer'):
+        protocol.comment('Adding viral buffer + beads to samples:')
+        for well, reagent, tip in checkpoint.progress(
+                zip(magsamps, buffer, tips1)):
+            p300.pick_up_tip(tip)
+            for _ in range(4):
+                p300.aspirate(160, reagent)
+                p300.dispense(160, well.top(-5))
+                p300.aspirate(10, well.top(-5))
             p300.aspirate(160, reagent)
-            p300.dispense(160, well.top(-5))
-            p300.aspirate(10, well.top(-5))
-        p300.aspirate(160, reagent)
-        p300.dispense(200, well.top(-10))
-        well_mix(8, well, 180)
-        p300.aspirate(20, well.top(-5))
-        p300.drop_tip()
+            p300.dispense(200, well.top(-10))
+            well_mix(8, well, 180)
+            p300.aspirate(20, well.top(-5))
+            p300.drop_tip()
+        checkpoint.done()
 
     # Add internal extraction control
-    protocol.comment('Adding Internal Extraction Control to each well:')
-    for well in magsamps24:
-        p20.pick_up_tip()
-        p20.aspirate(4, iec.bottom(0.5))
-        p20.dispense(4, well)
-        p20.blow_out()
-        p20.drop_tip()
+    if checkpoint.step('Internal extraction control'):
+        protocol.comment('Adding Internal Extraction Control to each well:')
+        for well in checkpoint.progress(magsamps24):
+            p20.pick_up_tip()
+            p20.aspirate(4, iec.bottom(0.5))
+            p20.dispense(4, well)
+            p20.blow_out()
+            p20.drop_tip()
+        checkpoint.done()
 
     # mix magbeads for 10 minutes
-    protocol.comment('Mixing samples+buffer+beads:')
-    for well, tip in zip(magsamps, tips2):
-        p300.pick_up_tip(tip)
-        well_mix(30, well, 180)
-        p300.blow_out()
-        p300.return_tip()
-
-    magdeck.engage(height=magheight)
-    protocol.comment('Incubating on magdeck for 5 minutes')
-    protocol.delay(minutes=5)
+    if checkpoint.step('Bead mixing'):
+        protocol.comment('Mixing samples+buffer+beads:')
+        for well, tip in checkpoint.progress(zip(magsamps, tips2)):
+            p300.pick_up_tip(tip)
+            well_mix(30, well, 180)
+            p300.blow_out()
+            p300.return_tip()
+        checkpoint.done()
 
     # Step 5 - Remove supernatant
     def supernatant_removal(vol, src, dest):
@@ -132,22 +152,28 @@ def run(protocol):
         p300.dispense(tvol+30, dest)
         p300.flow_rate.aspirate = 50
 
-    protocol.comment('Removing supernatant:')
+    if checkpoint.step('Binding supernatant removal'):
+        magdeck.engage(height=magheight)
+        protocol.comment('Incubating on magdeck for 5 minutes')
+        protocol.delay(minutes=5)
 
-    for well, tip in zip(magsamps, tips2):
-        p300.pick_up_tip(tip)
-        supernatant_removal(520, well, waste2)
-        p300.drop_tip()
+        protocol.comment('Removing supernatant:')
 
-    for well, tip in zip(magsamps, tips3):
-        p300.pick_up_tip(tip)
-        supernatant_removal(700, well, waste2)
-        p300.drop_tip()
+        for well, tip in checkpoint.progress(zip(magsamps, tips2)):
+            p300.pick_up_tip(tip)
+            supernatant_removal(520, well, waste2)
+            p300.drop_tip()
 
-    magdeck.disengage()
+        for well, tip in checkpoint.progress(zip(magsamps, tips3)):
+            p300.pick_up_tip(tip)
+            supernatant_removal(700, well, waste2)
+            p300.drop_tip()
+
+        magdeck.disengage()
+        checkpoint.done()
 
     def wash_step(src, mtimes, tips, wasteman, trash_tips=True):
-        for well, tip in zip(magsamps, tips):
+        for well, tip in checkpoint.progress(zip(magsamps, tips)):
             p300.pick_up_tip(tip)
             for _ in range(2):
                 p300.aspirate(165, src)
@@ -163,7 +189,7 @@ def run(protocol):
         protocol.comment('Incubating on MagDeck for 3 minutes.')
         protocol.delay(minutes=3)
 
-        for well, tip in zip(magsamps, tips):
+        for well, tip in checkpoint.progress(zip(magsamps, tips)):
             p300.pick_up_tip(tip)
             supernatant_removal(495, well, wasteman)
             if trash_tips:
@@ -172,66 +198,82 @@ def run(protocol):
                 p300.return_tip()
         magdeck.disengage()
 
-    protocol.comment('Wash step - Wash Buffer 1:')
-    wash_step(wb1, 20, tips4, waste2)
+    if checkpoint.step('Wash 1'):
+        protocol.comment('Wash step - Wash Buffer 1:')
+        wash_step(wb1, 20, tips4, waste2)
+        checkpoint.done()
 
-    protocol.comment('Wash step - Wash Buffer 2:')
-    wash_step(wb2, 10, tips5, waste2)
+    if checkpoint.step('Wash 2'):
+        protocol.comment('Wash step - Wash Buffer 2:')
+        wash_step(wb2, 10, tips5, waste2)
+        checkpoint.done()
 
-    protocol.comment('Wash step - Ethanol Wash 1:')
-    wash_step(ethanol1, 10, tips6, waste2)
+    if checkpoint.step('Wash 3'):
+        protocol.comment('Wash step - Ethanol Wash 1:')
+        wash_step(ethanol1, 10, tips6, waste2)
+        checkpoint.done()
 
-    protocol.comment('Wash step - Ethanol Wash 2:')
-    wash_step(ethanol2, 10, tips7, waste2)
+    if checkpoint.step('Wash 4'):
+        protocol.comment('Wash step - Ethanol Wash 2:')
+        wash_step(ethanol2, 10, tips7, waste2)
+        checkpoint.done()
 
-    protocol.comment('Allowing beads to air dry for 2 minutes.')
-    protocol.delay(minutes=2)
+    if checkpoint.step('Ethanol removal'):
+        protocol.comment('Allowing beads to air dry for 2 minutes.')
+        protocol.delay(minutes=2)
 
-    p300.flow_rate.aspirate = 20
-    protocol.comment('Removing any excess ethanol from wells:')
-    for well, tip in zip(magsamps, tips8):
-        p300.pick_up_tip(tip)
-        p300.transfer(
-            180, well.bottom().move(types.Point(x=-0.5, y=0, z=0.4)),
-            waste2, new_tip='never')
-        p300.drop_tip()
-    p300.flow_rate.aspirate = 50
+        p300.flow_rate.aspirate = 20
+        protocol.comment('Removing any excess ethanol from wells:')
+        for well, tip in checkpoint.progress(zip(magsamps, tips8)):
+            p300.pick_up_tip(tip)
+            p300.transfer(
+                180, well.bottom().move(types.Point(x=-0.5, y=0, z=0.4)),
+                waste2, new_tip='never')
+            p300.drop_tip()
+        p300.flow_rate.aspirate = 50
 
-    protocol.comment('Allowing beads to air dry for 10 minutes.')
-    protocol.delay(minutes=10)
+        protocol.comment('Allowing beads to air dry for 10 minutes.')
+        protocol.delay(minutes=10)
 
-    magdeck.disengage()
+        magdeck.disengage()
+        checkpoint.done()
 
-    protocol.comment('Adding NF-Water to wells for elution:')
-    for well, tip in zip(magsamps, tips9):
-        p300.pick_up_tip(tip)
-        p300.aspirate(20, water.top())
-        p300.aspirate(50, water)
-        for _ in range(15):
-            p300.dispense(
-                40, well.bottom().move(types.Point(x=1, y=0, z=2)))
-            p300.aspirate(
-                40, well.bottom().move(types.Point(x=1, y=0, z=0.5)))
-        p300.dispense(70, well)
-        p300.blow_out()
-        p300.drop_tip()
+    if checkpoint.step('Elution'):
+        protocol.comment('Adding NF-Water to wells for elution:')
+        for well, tip in checkpoint.progress(zip(magsamps, tips9)):
+            p300.pick_up_tip(tip)
+            p300.aspirate(20, water.top())
+            p300.aspirate(50, water)
+            for _ in range(15):
+                p300.dispense(
+                    40, well.bottom().move(types.Point(x=1, y=0, z=2)))
+                p300.aspirate(
+                    40, well.bottom().move(types.Point(x=1, y=0, z=0.5)))
+            p300.dispense(70, well)
+            p300.blow_out()
+            p300.drop_tip()
 
-    protocol.comment('Incubating at room temp for 2 minutes.')
-    protocol.delay(minutes=2)
+        protocol.comment('Incubating at room temp for 2 minutes.')
+        protocol.delay(minutes=2)
+        checkpoint.done()
 
     # Step 21 - Transfer elutes to clean plate
-    magdeck.engage(height=magheight)
-    protocol.comment('Incubating on MagDeck for 4 minutes.')
-    protocol.delay(minutes=4)
-
-    protocol.comment('Transferring elution to final plate:')
-    p300.flow_rate.aspirate = 10
-    for src, dest, tip in zip(magsamps, elutes, tips10):
-        p300.pick_up_tip(tip)
-        p300.aspirate(50, src.bottom().move(types.Point(x=-0.8, y=0, z=0.6)))
-        p300.dispense(50, dest)
-        p300.drop_tip()
-
-    magdeck.disengage()
+    if checkpoint.step('Elution transfer'):
+        magdeck.engage(height=magheight)
+        protocol.comment('Incubating on MagDeck for 4 minutes.')
+        protocol.delay(minutes=4)
+
+        protocol.comment('Transferring elution to final plate:')
+        p300.flow_rate.aspirate = 10
+        for src, dest, tip in checkpoint.progress(
+                zip(magsamps, elutes, tips10)):
+            p300.pick_up_tip(tip)
+            p300.aspirate(
+                50, src.bottom().move(types.Point(x=-0.8, y=0, z=0.6)))
+            p300.dispense(50, dest)
+            p300.drop_tip()
+
+        magdeck.disengage()
+        checkpoint.done()
 
     protocol.comment('Congratulations! Please freeze samples or move to C.')
@@ -21,6 +21,10 @@ NUM_SAMPLES = 30
 
 
 def run(ctx: protocol_api.ProtocolContext):
+    # Three PCR wells per sample, and the controls take the last two rows.
+    if not 1 <= NUM_SAMPLES <= 30:
+        raise ValueError('NUM_SAMPLES must be between 1 and 30')
+
     source_plate = ctx.load_labware(
         'nest_96_wellplate_100ul_pcr_full_skirt', '1',
         'RNA elution plate from station B')
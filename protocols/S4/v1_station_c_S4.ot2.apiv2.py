@@ -22,6 +22,13 @@ NUM_MASTERMIX = 3  # should be 2 or 3
 
 
 def run(ctx: protocol_api.ProtocolContext):
+    # A PCR well per mastermix for each sample, and the controls take the
+    # last two rows.
+    max_samples = 8*(12//NUM_MASTERMIX) - 2
+    if not 1 <= NUM_SAMPLES <= max_samples:
+        raise ValueError(
+            'NUM_SAMPLES must be between 1 and {}'.format(max_samples))
+
     source_plate = ctx.load_labware(
         'nest_96_wellplate_100ul_pcr_full_skirt', '1',
         'RNA elution plate from station B')
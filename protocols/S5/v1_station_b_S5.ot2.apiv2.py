@@ -2,6 +2,9 @@ import math
 from opentrons.types import Point
 from opentrons import protocol_api
 
+from supernatant import SupernatantRemoval
+from tip_ledger import TipLedger
+
 # metadata
 metadata = {
     'protocolName': 'S5 Station B Version 1',
@@ -27,8 +30,16 @@ REAGENT SETUP:
 
 NUM_SAMPLES = 96
 
+# Tips used on each rack are remembered between runs, so half-used racks can
+# stay on the deck; see tools/tip_ledger.py.  List the slots of any racks you
+# have replaced with full ones since the last run, or use 'all'.
+TIP_LEDGER_FILE = '/data/user_storage/tip_ledger_station_b_S5.json'
+REPLACED_TIP_RACKS = []
+
 
 def run(ctx: protocol_api.ProtocolContext):
+    if not 1 <= NUM_SAMPLES <= 96:
+        raise ValueError('NUM_SAMPLES must be between 1 and 96')
 
     # load labware and modules
     tempdeck = ctx.load_module('tempdeck', '1')
@@ -43,8 +54,9 @@ def run(ctx: protocol_api.ProtocolContext):
         'nest_12_reservoir_15ml', '5', 'reagent reservoir 2')
     waste = ctx.load_labware(
         'nest_1_reservoir_195ml', '7', 'waste reservoir').wells()[0].top()
+    ledger = TipLedger(ctx, TIP_LEDGER_FILE, replaced=REPLACED_TIP_RACKS)
     tips300 = [
-        ctx.load_labware(
+        ledger.load_rack(
             'opentrons_96_filtertiprack_200ul', slot, '300µl tiprack')
         for slot in ['3', '6', '8', '9', '10', '11']
     ]
@@ -70,33 +82,26 @@ def run(ctx: protocol_api.ProtocolContext):
     m300.flow_rate.aspirate = 150
     m300.flow_rate.dispense = 300
 
-    tip_counts = {m300: 0}
-    tip_maxes = {m300: len(tips300)*12}
-
     def pick_up(pip):
-        nonlocal tip_counts
-        if tip_counts[pip] == tip_maxes[pip]:
-            ctx.pause('Replace ' + str(pip.max_volume) + 'µl tipracks before \
-    resuming.')
-            pip.reset_tipracks()
-            tip_counts[pip] = 0
-        tip_counts[pip] += 1
-        pip.pick_up_tip()
-
-    def remove_supernatant(vol):
-        m300.flow_rate.aspirate = 30
+        ledger.pick_up_tip(pip)
+
+    def old_trips(vol):
+        # The old transfers of up to 270 uL were split again by transfer()
+        # to fit the 200 uL tips with the air gap.
         num_trans = math.ceil(vol/270)
-        vol_per_trans = vol/num_trans
+        return num_trans * math.ceil(vol/num_trans/170)
+
+    remover = SupernatantRemoval(
+        ctx, m300, air_gap=30, air_gap_at_waste=False, baseline_trip=old_trips)
+
+    def remove_supernatant(stage, vol):
+        m300.flow_rate.aspirate = 30
         for i, m in enumerate(mag_samples_m):
             side = -1 if i < 6 == 0 else 1
             loc = m.bottom(0.5).move(Point(x=side*2))
             if not m300.hw_pipette['has_tip']:
                 pick_up(m300)
-            for _ in range(num_trans):
-                m300.move_to(m.center())
-                m300.transfer(vol_per_trans, loc, waste, new_tip='never',
-                              air_gap=30)
-                m300.blow_out(waste)
+            remover.remove(stage, loc, waste, vol, approach=m.center())
             m300.drop_tip()
         m300.flow_rate.aspirate = 150
 
@@ -125,11 +130,11 @@ def run(ctx: protocol_api.ProtocolContext):
     ctx.delay(minutes=3, msg='Incubating on magnet for 3 minutes.')
 
     # remove supernatant
-    remove_supernatant(630)
+    remove_supernatant('Binding', 630)
 
     magdeck.disengage()
 
-    for wash in [wash_1, wash_2]:
+    for w, wash in enumerate([wash_1, wash_2]):
         # transfer and mix wash
         for i, m in enumerate(mag_samples_m):
             pick_up(m300)
@@ -145,7 +150,7 @@ def run(ctx: protocol_api.ProtocolContext):
         ctx.delay(minutes=3, msg='Incubating on magnet for 3 minutes.')
 
         # remove supernatant
-        remove_supernatant(510)
+        remove_supernatant('Wash {}'.format(w + 1), 510)
 
         magdeck.disengage()
 
@@ -160,7 +165,7 @@ def run(ctx: protocol_api.ProtocolContext):
         ctx.delay(seconds=30, msg='Incubating in EtOH for 30 seconds.')
 
         # remove supernatant
-        remove_supernatant(510)
+        remove_supernatant('Ethanol {}'.format(wash + 1), 510)
 
         if wash == 1:
             ctx.delay(minutes=10, msg='Airdrying on magnet for 10 minutes.')
@@ -191,3 +196,5 @@ def run(ctx: protocol_api.ProtocolContext):
         m300.blow_out(d.top(-2))
         m300.drop_tip()
     m300.flow_rate.aspirate = 150
+
+    remover.report()
@@ -0,0 +1,70 @@
+"""Resuming a two-plate Station_AB_Zymo.py run must not dose the second plate twice.
+
+The p20 adds the second plate's proteinase K during the first plate's
+incubations, so which wells a resumed run still has to dose depends on
+which incubations it skips.  For every step a run can resume from, the
+doses a full run gives before that step plus those of the resumed run
+must cover each well of the second plate exactly once.
+
+Run with the opentrons package installed: python -m pytest tests
+"""
+
+import collections
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("opentrons")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools"))
+
+import opentrons.simulate  # noqa: E402
+from opentrons.commands import types as command_types  # noqa: E402
+
+import checkpoint  # noqa: E402
+import runtime  # noqa: E402
+import simulation  # noqa: E402
+
+PATH = os.path.join(simulation.REPO_ROOT, "protocols/OMI_Clinical/StationB_Zymo_20200429/Station_AB_Zymo.py")
+NUM_SAMPLES = 16
+
+
+def run(tmp_path, resume_from=None):
+    """[("step", name) or ("dose", well)] for a simulated two-plate run."""
+    events = []
+
+    class LoggingCheckpoint(checkpoint.Checkpoint):
+        def step(self, name):
+            events.append(("step", name))
+            return super().step(name)
+
+    exec_globals = simulation.load_protocol(PATH, {
+        "NUM_SAMPLES": NUM_SAMPLES, "PLATES": 2, "RESUME_FROM": resume_from,
+        "CHECKPOINT_FILE": str(tmp_path / "checkpoint.json")})
+    exec_globals["Checkpoint"] = LoggingCheckpoint
+    context = opentrons.simulate.get_protocol_api(
+        exec_globals["metadata"]["apiLevel"], extra_labware=simulation.load_labware_definitions())
+
+    def observe(message):
+        if message["$"] == "before" and message["name"] == command_types.DISPENSE:
+            well = runtime.location_well(message["payload"]["location"])
+            if well is not None and str(well.parent).endswith(" on 7"):
+                events.append(("dose", well.display_name))
+
+    context.broker.subscribe(command_types.COMMAND, observe)
+    exec_globals["run"](context)
+    return events
+
+
+def test_resume_doses_second_plate_once(tmp_path):
+    full = run(tmp_path)
+    doses = [well for kind, well in full if kind == "dose"]
+    assert len(doses) == NUM_SAMPLES
+    steps = [name for kind, name in full if kind == "step"]
+    for resume_from in steps:
+        before = full[:full.index(("step", resume_from))]
+        resumed = run(tmp_path, resume_from)
+        counts = collections.Counter(
+            well for kind, well in before + resumed if kind == "dose")
+        assert counts == collections.Counter(doses), resume_from
@@ -0,0 +1,30 @@
+"""Smoke tests for the run time estimator that the other offline tools build on.
+
+Run with the opentrons package installed: python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("opentrons")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools"))
+
+import runtime  # noqa: E402
+import simulation  # noqa: E402
+
+PROTOCOLS = [
+    "protocols/OMI_Clinical/StationB_Zymo_20200429/Station_AB_Zymo.py",
+    "protocols/S2/v1_station_b_S2.ot2.apiv2.py",
+    "protocols/station-C-qpcr-map.py",
+]
+
+
+@pytest.mark.parametrize("path", PROTOCOLS)
+def test_estimate(path):
+    estimator = runtime.estimate(os.path.join(simulation.REPO_ROOT, path))
+    assert estimator.seconds > 0
+    assert estimator.travel_mm > 0
+    assert set(estimator.kinds) >= {"travel", "plunger", "tips"}
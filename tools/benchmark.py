@@ -0,0 +1,133 @@
+"""Catch protocol changes that make a run slower or use more tips.
+
+We fork protocols by date, and nothing told us whether the new copy was
+worse than the old one.  This simulates every protocol (as simulate_all.py
+does) and compares a few numbers from each run against a stored baseline:
+
+    estimated_seconds  estimated robot time (see runtime.py)
+    tips               tip pick-ups
+    aspirates          aspirate commands
+    dispenses          dispense commands
+    travel_mm          estimated gantry travel
+    delay_seconds      time spent in protocol.delay()
+
+Any metric that grows by more than its threshold (5% unless --threshold
+says otherwise) is a regression, and the script exits with status 1.  A
+protocol that simulated before and fails now is a regression too.
+
+Usage:
+
+    python tools/benchmark.py                  # compare against the baseline
+    python tools/benchmark.py --update         # store the current numbers
+    python tools/benchmark.py --threshold tips=0 estimated_seconds=0.1
+
+Commit benchmark-baseline.json along with a protocol change that is meant
+to change its numbers.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+
+import simulate_all
+import simulation
+
+BASELINE_PATH = os.path.join(simulation.REPO_ROOT, "benchmark-baseline.json")
+METRICS = ["estimated_seconds", "tips", "aspirates", "dispenses", "travel_mm", "delay_seconds"]
+DEFAULT_THRESHOLD = 0.05
+
+
+def measure(paths, labware, jobs):
+    """{protocol: {metric: value}} for every protocol that simulates."""
+    results = {}
+    with multiprocessing.Pool(jobs, simulate_all.init_worker, (labware, None)) as pool:
+        for summary in pool.imap_unordered(simulate_all.simulate_one, paths):
+            if summary["success"]:
+                results[summary["protocol"]] = {metric: summary[metric] for metric in METRICS}
+            else:
+                results[summary["protocol"]] = None
+    return dict(sorted(results.items()))
+
+
+def regressions(baseline, current, thresholds):
+    """Yield (protocol, message) for every metric that got worse."""
+    for protocol, before in baseline.items():
+        if protocol not in current:
+            continue
+        after = current[protocol]
+        if after is None:
+            if before is not None:
+                yield protocol, "no longer simulates"
+            continue
+        if before is None:
+            continue
+        for metric in METRICS:
+            old, new = before.get(metric), after[metric]
+            if old is None:
+                continue
+            limit = old * (1 + thresholds[metric])
+            if new > limit + 1e-9:
+                change = f"{(new - old) / old:+.1%}" if old else "up from 0"
+                yield protocol, f"{metric} {old} -> {new} ({change})"
+
+
+def parse_thresholds(specs):
+    thresholds = dict.fromkeys(METRICS, DEFAULT_THRESHOLD)
+    for spec in specs:
+        metric, _, value = spec.partition("=")
+        if metric not in thresholds or not value:
+            raise SystemExit(f"Bad threshold {spec!r}: expected METRIC=FRACTION, METRIC one of {', '.join(METRICS)}")
+        thresholds[metric] = float(value)
+    return thresholds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate every protocol and compare run time and tip usage against a stored baseline.")
+    parser.add_argument("paths", nargs="*", help="Protocol files or directories to search.  Defaults to protocols/ and experiments/.")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="The baseline JSON file.")
+    parser.add_argument("--update", action="store_true", help="Write the current numbers to the baseline instead of comparing.")
+    parser.add_argument("--threshold", nargs="+", default=[], metavar="METRIC=FRACTION", help=f"How much a metric may grow, e.g. tips=0.  Default {DEFAULT_THRESHOLD}.")
+    parser.add_argument("-L", "--custom-labware-path", action="append", default=[], help="A directory of extra labware definitions.  May be given more than once.")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Number of worker processes.  Defaults to one per core.")
+    args = parser.parse_args()
+    thresholds = parse_thresholds(args.threshold)
+
+    roots = [p for p in args.paths if os.path.isdir(p)]
+    paths = [os.path.abspath(p) for p in args.paths if os.path.isfile(p)]
+    if roots or not args.paths:
+        paths += simulation.find_protocols(roots or simulation.PROTOCOL_DIRS)
+    labware = simulation.load_labware_definitions(simulation.LABWARE_DIRS + args.custom_labware_path)
+    current = measure(paths, labware, args.jobs)
+
+    if args.update:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(current)
+        with open(args.baseline, "w") as f:
+            json.dump(dict(sorted(baseline.items())), f, indent=2)
+            f.write("\n")
+        print(f"Stored numbers for {len(current)} protocols in {args.baseline}.")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update to store one.")
+        return 2
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    found = list(regressions(baseline, current, thresholds))
+    for protocol, message in found:
+        print(f"REGRESSION {protocol}: {message}")
+    for protocol in sorted(set(current) - set(baseline)):
+        print(f"new        {protocol}: not in the baseline")
+    compared = len(set(current) & set(baseline))
+    print(f"{compared} protocols compared, {len({p for p, _ in found})} regressed.")
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""Let a protocol pick up where an interrupted run stopped.
+
+Protocol scripts import this module, so it must be importable on the robot
+as well as in simulation (see the README).
+
+Until now, recovering from an aborted run meant a hand-edited rescue copy
+of the script with the finished steps commented out (see
+StationB-48samples-Rescue20200406.py).  Instead, a script wraps each step
+like this:
+
+    checkpoint = Checkpoint(protocol, CHECKPOINT_FILE, resume=RESUME)
+    checkpoint.track(tr1, tr2, tips20)
+    ...
+    if checkpoint.step('Wash 1'):
+        for well, tip in checkpoint.progress(zip(magsamps, tips4)):
+            ...
+        checkpoint.done()
+
+As the run goes, the checkpoint file records which steps have finished, how
+far each loop wrapped in progress() got, and which tips are gone from the
+tracked racks.  Running the script again with RESUME = True skips finished
+steps and finished loop iterations, and marks the used tips as used, so
+pipettes that pick tips automatically carry on from the right one.  A step
+that was interrupted starts again from the iteration that was interrupted.
+
+Each step should leave the modules as it found them (magnet disengaged), or
+set them up itself, so that a run can resume at any step.
+
+Simulating a protocol never writes the checkpoint file: the OT-2 app
+simulates every protocol when it is uploaded, and that mustn't look like a
+finished run.  It does read it, so a simulation shows what a resumed run
+would do.
+"""
+
+import json
+import os
+import time
+
+
+class Checkpoint:
+    """Records a run's progress in a JSON file, and skips what's finished.
+
+    resume=False starts afresh, and overwrites any old checkpoint file as
+    soon as the first step finishes.  resume=True carries on from the file,
+    and on the robot refuses to start without one: running everything again
+    would dose the samples twice.
+    resume_from names a step to restart at whatever the file says, treating
+    every step before it as finished, which is what the hand-made rescue
+    scripts did.
+    """
+
+    def __init__(self, protocol, path, resume=False, resume_from=None):
+        self._protocol = protocol
+        self._path = path
+        self._racks = []
+        self._step = None
+        self._loops = 0
+        self._skipping = resume_from is not None
+        self._resume_from = resume_from
+        self.completed = []
+        self.progressed = {}
+        self.used_tips = {}
+        if resume and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.completed = state['completed']
+            self.progressed = state['progressed']
+            self.used_tips = state['used_tips']
+            protocol.comment('Resuming: {} steps already finished.'.format(
+                len(self.completed)))
+        elif resume and protocol.is_simulating():
+            protocol.comment(
+                'No checkpoint file at {}: simulating from the start.'.format(
+                    path))
+        elif resume:
+            raise ValueError(
+                'RESUME is set but there is no checkpoint file at {}.  Set '
+                'RESUME_FROM to the step to restart at instead.'.format(path))
+
+    def track(self, *racks):
+        """Persist tip usage for these tip racks, restoring it when resuming."""
+        for rack in racks:
+            self._racks.append(rack)
+            for name in self.used_tips.get(str(rack), []):
+                rack.use_tips(rack[name])
+
+    def step(self, name):
+        """Whether to run the step called name.  Call done() when it ends."""
+        if name == self._resume_from:
+            self._skipping = False
+        if self._skipping or name in self.completed:
+            self._protocol.comment(
+                'Skipping {}: finished in an earlier run.'.format(name))
+            return False
+        self._step = name
+        self._loops = 0
+        return True
+
+    def progress(self, items, name=None):
+        """Yield the items a step hasn't finished yet, recording each one.
+
+        Give a name for work that runs outside step() and done(), as for
+        record(): the loop is then recorded under that name, whichever step
+        it runs in.
+        """
+        if name is None:
+            name = self._step
+            key = '{} #{}'.format(self._step, self._loops)
+            self._loops += 1
+        else:
+            key = name
+        start = self.progressed.get(key, 0)
+        if start:
+            self._protocol.comment(
+                'Resuming {} at item {}.'.format(name, start + 1))
+        for i, item in enumerate(items):
+            if i < start:
+                continue
+            yield item
+            self.progressed[key] = i + 1
+            self._save()
+
+    def done(self):
+        self.completed.append(self._step)
+        self._step = None
+        self._save()
+
+    def finished(self, name):
+        """Whether work recorded as name is done, here or in an earlier run.
+
+        For work that runs inside other steps, such as tasks fitted into
+        their incubations, which can't be steps themselves.
+        """
+        return self._skipping or name in self.completed
+
+    def record(self, name):
+        """Record work that finished outside step() and done()."""
+        self.completed.append(name)
+        self._save()
+
+    def _save(self):
+        if self._protocol.is_simulating():
+            return
+        self.used_tips = {
+            str(rack): [well.display_name.split(' ')[0]
+                        for well in rack.wells() if not well.has_tip]
+            for rack in self._racks}
+        state = {
+            'completed': self.completed,
+            'progressed': self.progressed,
+            'used_tips': self.used_tips,
+            'saved': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = self._path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(state, f, indent=2)
+        # Atomic, so a crash while saving leaves the previous checkpoint.
+        os.replace(temporary, self._path)
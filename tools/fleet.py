@@ -0,0 +1,281 @@
+"""How many samples a fleet of Station A, B and C robots gets through in a shift.
+
+Plates move through the stations in order: a batch of samples is run on a
+Station A robot, carried to a Station B robot, then to a Station C robot.
+FleetSimulation is a small discrete-event simulation of that pipeline:
+
+* every station has a number of robots, and a run on one takes the time
+  simulation of the real station script estimates for the batch size
+  (see runtime.py), or a time you give it,
+* before each run an operator spends reload_minutes loading the deck, and
+  there are only so many operators, who serve downstream stations first so
+  finished plates don't pile up,
+* moving a plate to the next station takes handoff_minutes,
+* batches arrive every arrival_minutes, or with no limit if that's None.
+
+It reports samples finished per shift and per hour, how busy each
+station's robots are, and how long batches queue for a robot.  A batch is
+a plate's worth of wells; it counts as the number of samples the last
+station's script runs (the 48-well Station C plate holds 46 samples and two
+controls), or the batch size when the run time is given in minutes.  --suggest
+tries every split of a number of robots between the stations and lists
+the ones that finish the most samples.
+
+Usage:
+
+    python tools/fleet.py --robots A=3 B=4 C=2 --batch 48
+    python tools/fleet.py --suggest 9 --batch 24 48
+    python tools/fleet.py --durations minutes.json --robots AB=4 C=2
+
+A durations file maps stations to {batch size: minutes or protocol path},
+which is how to add 96-sample runs or the combined A+B scripts.
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import os
+import sys
+from collections import deque
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The current protocol for each station and batch size, relative to the
+# repository root.  Stations are listed in the order plates go through them.
+STATION_PROTOCOLS = {
+    "A": {
+        24: "protocols/OMI_Clinical/StationA_Zymo_20200413/StationA-24samples-Zymo-M-2020-04-13.py",
+        48: "protocols/OMI_Clinical/StationA_Zymo_20200413/StationA-48samples-Zymo-M-2020-04-13.py",
+    },
+    "B": {
+        24: "protocols/OMI_Clinical/StationB_Zymo_202004018/StationB-24samples-Zymo-20200418.py",
+        48: "protocols/OMI_Clinical/StationB_Zymo_202004018/StationB-48samples-Zymo-20200418.py",
+    },
+    "C": {
+        24: "protocols/OMI_Clinical/StationC-Clinical-2020-04-16/station-C-24clinical-2020-04-16.py",
+        48: "protocols/OMI_Clinical/StationC-Clinical-2020-04-16/station-C-46clinical-2020-04-18.py",
+    },
+}
+
+
+def batch_samples(stations):
+    """{batch: samples} for the last station of a {station: {batch: minutes or path}} dict.
+
+    A Station C layout's count is its numbered samples; anything else counts
+    the whole batch.
+    """
+    samples = {}
+    for batch, value in list(stations.values())[-1].items():
+        samples[int(batch)] = int(batch)
+        if isinstance(value, str):
+            import plate_map
+            import stationc
+            layout = stationc.load_layout(os.path.join(REPO_ROOT, value))
+            if "SAMPLE_MAP" in layout:
+                samples[int(batch)] = len(plate_map.parse(layout["SAMPLE_MAP"]).sample_numbers)
+    return samples
+
+
+def station_minutes(stations):
+    """Replace protocol paths in a {station: {batch: minutes or path}} dict with estimated minutes."""
+    minutes = {}
+    for station, batches in stations.items():
+        minutes[station] = {}
+        for batch, value in batches.items():
+            if isinstance(value, str):
+                # Only needs the opentrons package when there's something to simulate.
+                import runtime
+                value = runtime.estimate(os.path.join(REPO_ROOT, value)).seconds / 60
+            minutes[station][int(batch)] = value
+    return minutes
+
+
+class StationStats:
+    def __init__(self, robots):
+        self.robots = robots
+        self.busy_minutes = 0.0
+        self.runs = 0
+        self.waits = []
+
+    def utilisation(self, shift_minutes):
+        return self.busy_minutes / (self.robots * shift_minutes)
+
+
+class FleetSimulation:
+    """One shift of the pipeline.  Times are in minutes."""
+
+    def __init__(self, minutes, robots, batch, shift_hours=8, operators=1,
+                 reload_minutes=10, handoff_minutes=5, arrival_minutes=None, samples=None):
+        self.stations = list(minutes)
+        self.run_minutes = [minutes[station][batch] for station in self.stations]
+        self.robots = [robots[station] for station in self.stations]
+        self.batch = batch
+        # Samples a finished batch counts as, if not the whole batch.
+        self.samples = batch if samples is None else samples
+        self.shift = shift_hours * 60
+        self.operators = operators
+        self.reload = reload_minutes
+        self.handoff = handoff_minutes
+        self.arrival = arrival_minutes
+
+    def run(self):
+        stats = [StationStats(n) for n in self.robots]
+        queues = [deque() for _ in self.stations]
+        free_robots = list(self.robots)
+        free_operators = self.operators
+        events = []
+        order = itertools.count()
+        finished = 0
+
+        def schedule(time, kind, station):
+            heapq.heappush(events, (time, next(order), kind, station))
+
+        def busy(station, start, end):
+            stats[station].busy_minutes += max(0.0, min(end, self.shift) - min(start, self.shift))
+
+        if self.arrival is None:
+            # An endless backlog: the first station always has a batch waiting.
+            queues[0].append(0.0)
+        else:
+            schedule(0.0, "arrive", 0)
+
+        now = 0.0
+        while True:
+            # Start reloads, downstream stations first.
+            for station in reversed(range(len(self.stations))):
+                while free_operators and free_robots[station] and queues[station]:
+                    arrived = queues[station].popleft()
+                    if station == 0 and self.arrival is None:
+                        # The backlog never waits for a robot; the time
+                        # since the last reload isn't a queue.
+                        queues[0].append(now)
+                    else:
+                        stats[station].waits.append(now - arrived)
+                    free_operators -= 1
+                    free_robots[station] -= 1
+                    schedule(now + self.reload, "reloaded", station)
+            if not events or events[0][0] > self.shift:
+                break
+            now, _, kind, station = heapq.heappop(events)
+            if kind == "arrive":
+                queues[station].append(now)
+                if station == 0 and self.arrival is not None:
+                    schedule(now + self.arrival, "arrive", 0)
+            elif kind == "reloaded":
+                free_operators += 1
+                busy(station, now - self.reload, now + self.run_minutes[station])
+                stats[station].runs += 1
+                schedule(now + self.run_minutes[station], "finished", station)
+            elif kind == "finished":
+                free_robots[station] += 1
+                if station + 1 < len(self.stations):
+                    schedule(now + self.handoff, "arrive", station + 1)
+                else:
+                    finished += self.samples
+        return FleetResult(self, finished, stats)
+
+
+class FleetResult:
+    def __init__(self, simulation, samples, stats):
+        self.simulation = simulation
+        self.samples = samples
+        self.stats = stats
+
+    @property
+    def samples_per_hour(self):
+        return self.samples / (self.simulation.shift / 60)
+
+    def report(self):
+        fleet = self.simulation
+        batch = str(fleet.batch)
+        if fleet.samples != fleet.batch:
+            batch += f" ({fleet.samples} samples)"
+        lines = [
+            "{} robots ({}), batches of {}: {} samples per {:.0f} h shift, {:.1f} per hour.".format(
+                sum(fleet.robots), ", ".join(f"{s}={n}" for s, n in zip(fleet.stations, fleet.robots)),
+                batch, self.samples, fleet.shift / 60, self.samples_per_hour)]
+        for station, minutes, stats in zip(fleet.stations, fleet.run_minutes, self.stats):
+            line = "  {}: {:.0f} min runs, {} runs, {:.0%} busy".format(
+                station, minutes, stats.runs, stats.utilisation(fleet.shift))
+            if stats.waits:
+                line += ", queueing {:.0f} min on average, {:.0f} at most".format(
+                    sum(stats.waits) / len(stats.waits), max(stats.waits))
+            lines.append(line)
+        return "\n".join(lines)
+
+
+def suggest(minutes, total_robots, batches, top=5, samples=None, **options):
+    """The best splits of total_robots between the stations, most samples first.
+
+    samples is {batch: samples} as from batch_samples(); by default a batch
+    counts as its size.
+    """
+    stations = list(minutes)
+    results = []
+    for counts in itertools.product(range(1, total_robots + 1), repeat=len(stations)):
+        if sum(counts) != total_robots:
+            continue
+        for batch in batches:
+            if all(batch in minutes[station] for station in stations):
+                results.append(FleetSimulation(
+                    minutes, dict(zip(stations, counts)), batch,
+                    samples=(samples or {}).get(batch), **options).run())
+    results.sort(key=lambda result: -result.samples)
+    return results[:top]
+
+
+def parse_robots(specs):
+    robots = {}
+    for spec in specs:
+        station, _, count = spec.partition("=")
+        robots[station] = int(count)
+    return robots
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a shift of Station A, B and C robots handing plates to each other.")
+    parser.add_argument("--durations", help="JSON file of {station: {batch size: minutes or protocol path}}.  Defaults to simulating the current station scripts.")
+    parser.add_argument("--save-durations", metavar="FILE", help="Write the run times used to this JSON file, to reuse with --durations.")
+    parser.add_argument("--robots", nargs="+", default=[], metavar="STATION=N", help="Robots per station, e.g. A=3 B=4 C=2.")
+    parser.add_argument("--suggest", type=int, metavar="N", help="Try every split of N robots between the stations.")
+    parser.add_argument("--batch", type=int, nargs="+", default=[48], help="Samples per plate.  With --suggest, every size given is tried.")
+    parser.add_argument("--shift-hours", type=float, default=8)
+    parser.add_argument("--operators", type=int, default=1, help="People loading robots.")
+    parser.add_argument("--reload-minutes", type=float, default=10, help="Operator time to load a robot for a run.")
+    parser.add_argument("--handoff-minutes", type=float, default=5, help="Time to carry a plate to the next station.")
+    parser.add_argument("--arrival-minutes", type=float, help="Minutes between new batches.  Defaults to an endless backlog.")
+    args = parser.parse_args()
+
+    stations = STATION_PROTOCOLS
+    if args.durations:
+        with open(args.durations) as f:
+            stations = json.load(f)
+    for batch in args.batch:
+        missing = [station for station, batches in stations.items() if batch not in map(int, batches)]
+        if missing:
+            parser.error(f"no run time for batches of {batch} at {', '.join(missing)}")
+    minutes = station_minutes(stations)
+    samples = batch_samples(stations)
+    if args.save_durations:
+        with open(args.save_durations, "w") as f:
+            json.dump(minutes, f, indent=2)
+
+    options = dict(
+        shift_hours=args.shift_hours, operators=args.operators, reload_minutes=args.reload_minutes,
+        handoff_minutes=args.handoff_minutes, arrival_minutes=args.arrival_minutes)
+    if args.suggest:
+        for result in suggest(minutes, args.suggest, args.batch, samples=samples, **options):
+            print(result.report())
+        return 0
+    robots = parse_robots(args.robots)
+    missing = [station for station in minutes if station not in robots]
+    if missing:
+        parser.error(f"--robots needs a count for {', '.join(missing)}")
+    for batch in args.batch:
+        print(FleetSimulation(minutes, robots, batch, samples=samples[batch], **options).run().report())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
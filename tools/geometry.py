@@ -0,0 +1,72 @@
+"""Labware geometry as NumPy arrays, for working on every well at once.
+
+A labware definition stores each well as its own JSON object, so anything
+that looks at all the wells of a plate does hundreds of dict lookups.
+LabwareGeometry unpacks a definition once into parallel arrays, in the
+definition's column-major well order (A1, B1, ... H1, A2, ...):
+
+    names      well names, and index maps each name to its position
+    centers    (n, 3) x, y of the well's centre and z of its bottom, in mm
+               from the labware's front left bottom corner
+    depths     mm
+    volumes    total liquid volume, uL
+    sizes      (n, 2) x and y size: the diameter twice for circular wells
+    circular   True for circular wells
+
+Each array covers the whole plate, so callers work on every well at once,
+e.g. scrape_labware.py draws a plate's wells from them:
+
+    plate = geometry.for_uri("custom_beta/nest_96_deepwell_2ml/1", custom_labware)
+    radii = plate.sizes[plate.circular, 0] / 2
+
+Protocol scripts and the modules they import (routing.py, stationc.py) don't
+use this, as they must run with only what the robot has installed.
+"""
+
+import numpy as np
+import opentrons.protocol_api.labware
+
+import labware_registry
+
+
+class LabwareGeometry:
+    def __init__(self, definition):
+        self.uri = labware_registry.uri(definition)
+        self.names = tuple(name for column in definition["ordering"] for name in column)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        wells = [definition["wells"][name] for name in self.names]
+        self.centers = np.array([(w["x"], w["y"], w["z"]) for w in wells], dtype=np.float64)
+        self.depths = np.array([w["depth"] for w in wells], dtype=np.float64)
+        self.volumes = np.array([w["totalLiquidVolume"] for w in wells], dtype=np.float64)
+        self.circular = np.array([w["shape"] == "circular" for w in wells])
+        self.sizes = np.array(
+            [(w["diameter"], w["diameter"]) if w["shape"] == "circular" else (w["xDimension"], w["yDimension"])
+             for w in wells], dtype=np.float64)
+        dimensions = definition["dimensions"]
+        self.dimensions = np.array(
+            (dimensions["xDimension"], dimensions["yDimension"], dimensions["zDimension"]), dtype=np.float64)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, name):
+        """The position of a well by name, e.g. plate["A1"] == 0."""
+        return self.index[name]
+
+
+_cache = {}
+
+
+def for_uri(uri, custom_labware=None):
+    """The LabwareGeometry for a namespace/loadName/version, built once per process.
+
+    custom_labware is a {uri: definition} dict checked before the labware
+    that ships with the robot software.
+    """
+    if uri not in _cache:
+        definition = (custom_labware or {}).get(uri)
+        if definition is None:
+            namespace, load_name, version = uri.split("/")
+            definition = opentrons.protocol_api.labware.get_labware_definition(load_name, namespace, int(version))
+        _cache[uri] = LabwareGeometry(definition)
+    return _cache[uri]
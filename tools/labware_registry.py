@@ -0,0 +1,138 @@
+"""Load custom labware definitions once, and keep them parsed between runs.
+
+Our custom definitions are 8-30 KB of JSON each, and every simulation used
+to read, parse and check all of them again.  The registry parses each file
+once per process, and keeps the checked definitions in a pickle cache next
+to the repository so that later processes don't parse them at all.  A cache
+entry is reused while the file's mtime and size are unchanged, or, if they
+have changed, while the file's SHA-256 still matches (a fresh checkout or a
+touch doesn't make us re-parse).
+
+Usage:
+
+    definitions = labware_registry.load(["labware", "my-labware"])
+    context = opentrons.simulate.get_protocol_api("2.2", extra_labware=definitions)
+"""
+
+import glob
+import hashlib
+import json
+import os
+import pickle
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".labware-cache.pickle")
+
+# Bump when the cached form changes, so old caches are ignored.
+CACHE_VERSION = 1
+
+# What every definition needs for the simulator and our tools to use it.
+REQUIRED_KEYS = ["namespace", "version", "parameters", "ordering", "wells", "dimensions", "metadata"]
+REQUIRED_WELL_KEYS = ["x", "y", "z", "depth", "totalLiquidVolume", "shape"]
+
+
+class LabwareDefinitionError(ValueError):
+    pass
+
+
+def uri(definition):
+    """The namespace/loadName/version string the simulator loads labware by."""
+    return "{}/{}/{}".format(definition["namespace"], definition["parameters"]["loadName"], definition["version"])
+
+
+def check(definition, path):
+    """Raise LabwareDefinitionError if a definition is missing anything we rely on."""
+    missing = [key for key in REQUIRED_KEYS if key not in definition]
+    if missing or "loadName" not in definition["parameters"]:
+        raise LabwareDefinitionError(f"{path}: missing {', '.join(missing) or 'parameters.loadName'}")
+    ordered = [name for column in definition["ordering"] for name in column]
+    if sorted(ordered) != sorted(definition["wells"]):
+        raise LabwareDefinitionError(f"{path}: ordering and wells list different wells")
+    for name, well in definition["wells"].items():
+        missing = [key for key in REQUIRED_WELL_KEYS if key not in well]
+        if missing:
+            raise LabwareDefinitionError(f"{path}: well {name} is missing {', '.join(missing)}")
+        size_keys = ["diameter"] if well["shape"] == "circular" else ["xDimension", "yDimension"]
+        if any(key not in well for key in size_keys):
+            raise LabwareDefinitionError(f"{path}: well {name} is missing its {' and '.join(size_keys)}")
+
+
+class Registry:
+    """Parsed labware definitions by file, backed by an on-disk cache."""
+
+    def __init__(self, cache_path=CACHE_PATH):
+        self.cache_path = cache_path
+        # {path: (mtime_ns, size, sha256, definition)}
+        self.entries = {}
+        self._dirty = False
+        self._read_cache()
+
+    def _read_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "rb") as f:
+                version, entries = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError):
+            return
+        if version == CACHE_VERSION:
+            self.entries = entries
+
+    def save(self):
+        """Write the cache back to disk if anything new was parsed."""
+        if not self._dirty or not self.cache_path:
+            return
+        temporary = f"{self.cache_path}.{os.getpid()}"
+        try:
+            with open(temporary, "wb") as f:
+                pickle.dump((CACHE_VERSION, self.entries), f, pickle.HIGHEST_PROTOCOL)
+            # Atomic, so parallel workers never see half a cache.
+            os.replace(temporary, self.cache_path)
+        except OSError:
+            # A read-only checkout still works, it just parses every time.
+            return
+        self._dirty = False
+
+    def definition(self, path):
+        """The checked definition in a JSON file, parsing it only if it changed."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        entry = self.entries.get(path)
+        if entry and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+            return entry[3]
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if entry and entry[2] == digest:
+            definition = entry[3]
+        else:
+            definition = json.loads(data.decode("utf-8"))
+            check(definition, path)
+        self.entries[path] = (stat.st_mtime_ns, stat.st_size, digest, definition)
+        self._dirty = True
+        return definition
+
+    def load(self, dirs):
+        """Return {uri: definition} for every labware definition JSON file in dirs."""
+        definitions = {}
+        for directory in dirs:
+            for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+                definition = self.definition(path)
+                definitions[uri(definition)] = definition
+        self.save()
+        return definitions
+
+
+_registry = None
+
+
+def registry():
+    """This process's Registry."""
+    global _registry
+    if _registry is None:
+        _registry = Registry()
+    return _registry
+
+
+def load(dirs):
+    """Return {uri: definition} for every labware definition JSON file in dirs."""
+    return registry().load(dirs)
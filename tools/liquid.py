@@ -0,0 +1,71 @@
+"""Track the liquid in reservoir wells, so pipettes aspirate near the surface.
+
+Protocol scripts import this module, so it must be importable on the robot
+as well as in simulation (see the README).
+
+Our scripts aspirate from troughs at a fixed height near the bottom, and
+slowly, because the tip may be deep in the liquid.  A LiquidTracker knows
+how much is in each well it has been told about, and so how high the
+surface is.  aspirate() goes only submerge mm below where the surface will
+be once the volume is drawn, never lower than min_height above the bottom,
+and aspirates faster (fast_rate times the pipette's flow rate) while the
+tip is well clear of the bottom.
+
+Heights assume straight-walled wells: the cross-section is the well's
+volume over its depth.  That is right for reservoirs and deepwell plates,
+and puts the tip deeper than it needs to be in tapered wells.  Seed each
+well with what the run will draw from it (add()), not with what you think
+the operator pours in: if there is more, the tip is simply deeper than it
+needs to be.  If there could be less, for instance because a resumed run
+skips steps that already drew from the well, don't track it.  Nor
+suspensions that settle, like bead buffer: the surface is where there are
+fewest beads.
+
+    liquid = LiquidTracker()
+    liquid.add(trough['A4'], 8 * 495)
+    ...
+    liquid.aspirate(p300, 165, trough['A4'])
+"""
+
+
+class LiquidTracker:
+    def __init__(self, submerge=2.0, min_height=1.0, slow_height=5.0,
+                 fast_rate=2.0):
+        self.submerge = submerge
+        self.min_height = min_height
+        self.slow_height = slow_height
+        self.fast_rate = fast_rate
+        self._volumes = {}
+
+    def add(self, well, volume):
+        """Record volume uL going into well."""
+        # Wells are keyed by "A1 of <labware>", which is unique on a deck.
+        key = well.display_name
+        self._volumes[key] = self._volumes.get(key, 0) + volume
+
+    def volume(self, well):
+        return self._volumes.get(well.display_name, 0)
+
+    def height(self, well, volume=None):
+        """Height of the surface above the bottom of well, in mm."""
+        if volume is None:
+            volume = self.volume(well)
+        depth = well.top().point.z - well.bottom().point.z
+        return volume / (well.max_volume / depth)
+
+    def aspirate(self, pipette, volume, well, fast_rate=None):
+        """Aspirate volume into each channel from well, just under the surface.
+
+        fast_rate overrides the tracker's, e.g. 1 for viscous liquids.
+        """
+        if well.display_name not in self._volumes:
+            pipette.aspirate(volume, well)
+            return
+        remaining = max(0, self.volume(well) - volume * pipette.channels)
+        height = max(
+            self.min_height, self.height(well, remaining) - self.submerge)
+        if fast_rate is None:
+            fast_rate = self.fast_rate
+        rate = fast_rate if height >= self.slow_height else 1.0
+        self._volumes[well.display_name] = remaining
+        pipette.aspirate(volume, well.bottom(height), rate=rate)
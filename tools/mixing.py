@@ -0,0 +1,94 @@
+"""Pick mix cycles and flow rates from what a mix has to achieve.
+
+Protocol scripts import this module, so it must be importable on the robot
+as well as in simulation (see the README).
+
+Station B mixed with hand-tuned cycle counts, always 180 uL at the
+script's slow flow rates, whatever was in the well.  What a mix achieves is
+closer to the number of times it turns over the well's contents:
+
+    turnovers = cycles * mix volume / well volume
+
+A MixingStage takes a target number of turnovers instead.  It mixes with
+as much as the tip holds (or most of the well, in a small one), so it needs
+the fewest cycles, and sets the flow rates so each stroke takes a fixed
+time, within what the tip can take.  It never aspirates or dispenses
+faster than the script already does, unless told a faster rate has been
+validated: viscous lysis buffer and bead suspensions don't keep up with a
+fast plunger.  It adds up the time each named stage spends mixing, and
+report() comments it, so the stages worth trimming stand out.
+"""
+
+import math
+from collections import OrderedDict
+
+
+class MixingStage:
+    """Mixes for a pipette, keeping the reserve volume in the tip throughout.
+
+    reserve uL stays in the tip between strokes, so it never blows air into
+    the well.  The mix volume is at most tip_fraction of the tip, less the
+    reserve, and at most well_fraction of the well.  max_aspirate_rate and
+    max_dispense_rate default to the pipette's flow rates when mix() is
+    called.
+    """
+
+    def __init__(self, protocol, pipette, reserve=20, tip_fraction=0.9,
+                 well_fraction=0.8, aspirate_seconds=2.5,
+                 dispense_seconds=1.0, max_aspirate_rate=None,
+                 max_dispense_rate=None):
+        self._protocol = protocol
+        self._pipette = pipette
+        self.reserve = reserve
+        self.tip_fraction = tip_fraction
+        self.well_fraction = well_fraction
+        self.aspirate_seconds = aspirate_seconds
+        self.dispense_seconds = dispense_seconds
+        self.max_aspirate_rate = max_aspirate_rate
+        self.max_dispense_rate = max_dispense_rate
+        # {stage: [wells, seconds]}
+        self.stages = OrderedDict()
+
+    def plan(self, well_volume, turnovers):
+        """(cycles, mix volume, aspirate rate, dispense rate) for one well."""
+        volume = min(
+            self._pipette.max_volume * self.tip_fraction - self.reserve,
+            well_volume * self.well_fraction)
+        cycles = max(1, math.ceil(turnovers * well_volume / volume))
+        max_aspirate_rate = self.max_aspirate_rate
+        if max_aspirate_rate is None:
+            max_aspirate_rate = self._pipette.flow_rate.aspirate
+        max_dispense_rate = self.max_dispense_rate
+        if max_dispense_rate is None:
+            max_dispense_rate = self._pipette.flow_rate.dispense
+        aspirate_rate = min(volume / self.aspirate_seconds, max_aspirate_rate)
+        dispense_rate = min(volume / self.dispense_seconds, max_dispense_rate)
+        return cycles, volume, aspirate_rate, dispense_rate
+
+    def mix(self, stage, aspirate_location, dispense_location, well_volume,
+            turnovers):
+        """Mix well_volume uL until it has turned over turnovers times."""
+        cycles, volume, aspirate_rate, dispense_rate = self.plan(
+            well_volume, turnovers)
+        pipette = self._pipette
+        flow_rates = pipette.flow_rate.aspirate, pipette.flow_rate.dispense
+        pipette.flow_rate.aspirate = aspirate_rate
+        pipette.flow_rate.dispense = dispense_rate
+        pipette.aspirate(self.reserve, aspirate_location)
+        for _ in range(cycles):
+            pipette.aspirate(volume, aspirate_location)
+            pipette.dispense(volume, dispense_location)
+        pipette.dispense(self.reserve, dispense_location)
+        pipette.flow_rate.aspirate, pipette.flow_rate.dispense = flow_rates
+
+        stroke = volume + self.reserve / cycles
+        seconds = cycles * (stroke / aspirate_rate + stroke / dispense_rate)
+        totals = self.stages.setdefault(stage, [0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+
+    def report(self):
+        for stage, (wells, seconds) in self.stages.items():
+            self._protocol.comment(
+                'Mixing for {}: {} wells, about {:.0f} seconds of '
+                'plunger time.'.format(stage, wells, seconds))
@@ -0,0 +1,90 @@
+"""Compiled, cached parsing of the tab-separated 8x12 plate maps Station C uses.
+
+parse() turns a map like MASTER_MIX_MAP or SAMPLE_MAP into a PlateMap:
+
+* ids, 96 interned label ids in a compact array, row by row (A1, A2, ...,
+  B1, ...), with 0 meaning an empty well,
+* labels, the label for each id,
+* wells_by_label, the wells each label is in, in map order,
+* sample_numbers, the n of each "Sample n" label, so nobody needs to run
+  the regex again.
+
+Results are memoised on the map's content, so validating or simulating the
+same layout again costs a dictionary lookup.
+"""
+
+import array
+import functools
+import re
+import sys
+
+ROWS = 8
+COLUMNS = 12
+ROW_NAMES = 'ABCDEFGH'
+
+SAMPLE_PATTERN = re.compile(r'Sample ([0-9]+)')
+
+
+def well_name(well):
+    """The name of a row-major well index: 0 is A1, 12 is B1."""
+    row, column = divmod(well, COLUMNS)
+    return ROW_NAMES[row] + str(column + 1)
+
+
+def well_index(name):
+    """The row-major index of a well name: A1 is 0, B1 is 12."""
+    return ROW_NAMES.index(name[0]) * COLUMNS + int(name[1:]) - 1
+
+
+class PlateMap:
+    def __init__(self, ids, labels):
+        self.ids = ids
+        self.labels = labels
+        wells_by_label = {label: [] for label in labels[1:]}
+        for well, label_id in enumerate(ids):
+            if label_id:
+                wells_by_label[labels[label_id]].append(well)
+        # Parsed maps are shared through the cache, so keep them read-only.
+        self.wells_by_label = {label: tuple(wells) for label, wells in wells_by_label.items()}
+        self.sample_numbers = {}
+        for label in labels[1:]:
+            match = SAMPLE_PATTERN.match(label)
+            if match:
+                self.sample_numbers[label] = int(match.groups()[0])
+
+    def __getitem__(self, well):
+        """The label in a well, by row-major index or name; '' if empty."""
+        if isinstance(well, str):
+            well = well_index(well)
+        return self.labels[self.ids[well]]
+
+    def rows(self):
+        """The label ids as 8 rows of 12."""
+        return [self.ids[i * COLUMNS:(i + 1) * COLUMNS] for i in range(ROWS)]
+
+    def wells(self):
+        """(well, label) for every non-empty well, row by row."""
+        return [(well, self.labels[label_id]) for well, label_id in enumerate(self.ids) if label_id]
+
+
+def parse(plate_map):
+    return _parse(plate_map.strip('\n '))
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse(plate_map):
+    labels = ['']
+    label_ids = {'': 0}
+    ids = array.array('B', bytes(ROWS * COLUMNS))
+    for i, row in enumerate(plate_map.split('\n')):
+        if i >= ROWS:
+            raise ValueError(f'Plate map has more than {ROWS} rows')
+        cells = row.split('\t')
+        if len(cells) > COLUMNS:
+            raise ValueError(f'Row {ROW_NAMES[i]} of plate map has more than {COLUMNS} columns')
+        for j, label in enumerate(cells):
+            if label not in label_ids:
+                label_ids[label] = len(labels)
+                labels.append(sys.intern(label))
+            ids[i * COLUMNS + j] = label_ids[label]
+    return PlateMap(ids, tuple(labels))
@@ -0,0 +1,123 @@
+"""Which source wells could have ended up in which destination wells.
+
+ProvenanceIndex makes one pass over a run's events (see runlog.py), in time
+order, following each physical tip.  Contact goes both ways, as in
+tip_planner.py: a tip that aspirates from a well leaves what it carries
+there and takes up everything in the well, and a tip that dispenses or
+blows out into a well leaves what it carries, and takes up what is in
+the well too if it went below the top.  Tips are runlog's tip numbers, so
+a tip returned to its rack keeps what it carried when it is picked up
+again, and a fresh tip from a reset or replaced rack starts clean.
+
+Multi-channel pipettes are followed by the well under their first channel,
+so for them provenance is per column.
+
+Usage: python tools/provenance.py protocol.py --samples "Elution Plate"
+lists destination wells that received material from more than one well of
+the labware named like "Elution Plate", which is what a cross-contaminating
+protocol looks like.  --touched-by and --shared-tip answer questions about
+one well, e.g. --touched-by A3 "Elution Plate" for sample 17 of a Station C
+run.
+"""
+
+import argparse
+import sys
+from collections import defaultdict
+
+import runlog
+import simulation
+
+
+class ProvenanceIndex:
+    def __init__(self, events):
+        self.events = events
+        self._well_count = len(events.well_names)
+        keys = events.labware.astype('int64') * self._well_count + events.well
+        keys[events.well < 0] = -1
+
+        # For every well, the wells whose material could be in it.
+        self.contributors = defaultdict(set)
+        # For every physical tip, the wells it went into.
+        self.tip_wells = defaultdict(set)
+
+        # For every physical tip, the wells whose material could be on it.
+        carried = defaultdict(set)
+        for kind, tip, key, depth in zip(events.kind.tolist(), events.tip.tolist(), keys.tolist(), events.depth.tolist()):
+            if kind in (runlog.PICK_UP_TIP, runlog.DROP_TIP) or tip < 0 or key < 0:
+                continue
+            self.tip_wells[tip].add(key)
+            self.contributors[key] |= carried[tip] - {key}
+            if kind == runlog.ASPIRATE or depth > 0:
+                carried[tip].add(key)
+                carried[tip] |= self.contributors[key]
+
+        self.contributed_to = defaultdict(set)
+        for well, sources in self.contributors.items():
+            for source in sources:
+                self.contributed_to[source].add(well)
+
+    def key(self, well_name, labware_name):
+        """The key for a well, matching labware by substring of its name."""
+        matches = [i for i, name in enumerate(self.events.labware_names) if labware_name in name]
+        if len(matches) != 1:
+            raise ValueError(f'"{labware_name}" matches {len(matches)} labware, not one')
+        if well_name not in self.events.well_names:
+            raise ValueError(f'No events in well {well_name}')
+        return matches[0] * self._well_count + self.events.well_names.index(well_name)
+
+    def name(self, key):
+        labware, well = divmod(key, self._well_count)
+        return '{} of {}'.format(self.events.well_names[well], self.events.labware_names[labware])
+
+    def touched_by(self, well_name, labware_name):
+        """Wells that could contain material from this well."""
+        return sorted(self.name(k) for k in self.contributed_to[self.key(well_name, labware_name)])
+
+    def shared_tip(self, well_name, labware_name):
+        """Other wells that any tip which went into this well also went into."""
+        key = self.key(well_name, labware_name)
+        wells = set()
+        for touched in self.tip_wells.values():
+            if key in touched:
+                wells |= touched
+        wells.discard(key)
+        return sorted(self.name(k) for k in wells)
+
+    def mixed_sources(self, labware_name):
+        """{well: sources} for wells with material from more than one well of a labware."""
+        labware = {i for i, name in enumerate(self.events.labware_names) if labware_name in name}
+        mixed = {}
+        for well, sources in self.contributors.items():
+            # A well of the labware itself holds its own material too.
+            from_labware = [s for s in sources | {well} if s // self._well_count in labware]
+            if len(from_labware) > 1:
+                mixed[self.name(well)] = sorted(self.name(s) for s in from_labware)
+        return mixed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trace which wells' contents could have reached which other wells in a protocol.")
+    parser.add_argument("file", help="The protocol script to trace.")
+    parser.add_argument("--samples", metavar="LABWARE", help="Check that no well gets material from two wells of this labware.")
+    parser.add_argument("--touched-by", nargs=2, metavar=("WELL", "LABWARE"), help="List the wells that could contain material from this well.")
+    parser.add_argument("--shared-tip", nargs=2, metavar=("WELL", "LABWARE"), help="List the wells that shared a tip with this well.")
+    args = parser.parse_args()
+
+    recorder = runlog.EventRecorder()
+    simulation.simulate(args.file, observers=[recorder])
+    index = ProvenanceIndex(recorder.table())
+
+    if args.touched_by:
+        print("\n".join(index.touched_by(*args.touched_by)))
+    if args.shared_tip:
+        print("\n".join(index.shared_tip(*args.shared_tip)))
+    if args.samples:
+        mixed = index.mixed_sources(args.samples)
+        for well, sources in sorted(mixed.items()):
+            print(f"{well} <- {', '.join(sources)}")
+        return 1 if mixed else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""Attribute a protocol's estimated robot time to the lines of code that spend it.
+
+runtime.py says how long each phase takes, but not whether a slow Station B
+run is slow in well_mix(), in supernatant_removal() or in a delay.
+RobotProfiler is a simulation observer that charges each command's
+estimated seconds (see runtime.py), and one move if the gantry travels for
+it, to the Python call stack that issued it: the protocol script's frames,
+plus those of the helper modules in tools/ that it imports.  Like cProfile,
+but in robot seconds instead of CPU seconds.
+
+It prints the functions and lines that cost the most, and --collapsed
+writes one "frame;frame;frame value" line per distinct stack, the folded
+format that flamegraph.pl, speedscope and inferno read:
+
+    python tools/robot_profile.py protocols/OMI_Clinical/StationB_Zymo_20200429/Station_AB_Zymo.py
+    python tools/robot_profile.py <protocol> --collapsed ab.folded
+    flamegraph.pl --countname ms ab.folded > ab.svg
+
+(The module isn't called profile.py because that would hide the standard
+library's profile module from scripts in this directory.)
+"""
+
+import argparse
+import linecache
+import os
+import sys
+from collections import OrderedDict
+
+import runtime
+import simulation
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+# Tools that drive the simulation rather than being called by the protocol.
+OFFLINE_MODULES = {"simulation.py", "runtime.py", "robot_profile.py"}
+METRICS = ["seconds", "moves"]
+
+
+class RobotProfiler:
+    """Simulation observer that charges estimated robot time to call stacks.
+
+    With helpers=False only the protocol script's own frames are kept, so
+    time spent in an imported helper is charged to the line that called it.
+    """
+
+    def __init__(self, path, helpers=True, model=runtime.RobotModel):
+        self.path = os.path.abspath(path)
+        self.helpers = helpers
+        self.estimator = runtime.RuntimeEstimator(model)
+        # {((filename, function, line), ...): [seconds, moves]}, outermost frame first.
+        self.stacks = OrderedDict()
+
+    def _is_tracked(self, filename):
+        filename = os.path.abspath(filename)
+        if filename == self.path:
+            return True
+        return (self.helpers and os.path.dirname(filename) == TOOLS_DIR
+                and os.path.basename(filename) not in OFFLINE_MODULES)
+
+    def stack(self):
+        frames = []
+        frame = sys._getframe(1)
+        while frame is not None:
+            code = frame.f_code
+            if self._is_tracked(code.co_filename):
+                frames.append((code.co_filename, code.co_name, frame.f_lineno))
+            frame = frame.f_back
+        return tuple(reversed(frames))
+
+    def __call__(self, message):
+        seconds, travel_mm = self.estimator.seconds, self.estimator.travel_mm
+        self.estimator(message)
+        seconds = self.estimator.seconds - seconds
+        moves = 1 if self.estimator.travel_mm > travel_mm else 0
+        if not seconds and not moves:
+            return
+        totals = self.stacks.setdefault(self.stack(), [0.0, 0])
+        totals[0] += seconds
+        totals[1] += moves
+
+    def by_function(self):
+        """{(filename, function): [self seconds, self moves, total seconds, total moves]}."""
+        functions = {}
+        for stack, (seconds, moves) in self.stacks.items():
+            for i, (filename, function, _) in enumerate(stack):
+                totals = functions.setdefault((filename, function), [0.0, 0, 0.0, 0])
+                if i == len(stack) - 1:
+                    totals[0] += seconds
+                    totals[1] += moves
+            # Recursion or repeated frames only count once towards the total.
+            for key in {(filename, function) for filename, function, _ in stack}:
+                functions[key][2] += seconds
+                functions[key][3] += moves
+        return functions
+
+    def by_line(self):
+        """{(filename, line): [seconds, moves]} for the innermost tracked frame."""
+        lines = {}
+        for stack, (seconds, moves) in self.stacks.items():
+            key = (stack[-1][0], stack[-1][2]) if stack else ("<setup>", 0)
+            totals = lines.setdefault(key, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += moves
+        return lines
+
+    def collapsed(self, metric="seconds"):
+        """Folded stacks, one line each, valued in robot milliseconds or moves."""
+        index = METRICS.index(metric)
+        lines = []
+        for stack, totals in self.stacks.items():
+            value = round(1000 * totals[0]) if index == 0 else totals[1]
+            if not value:
+                continue
+            frames = [f"{function} ({os.path.basename(filename)}:{line})" for filename, function, line in stack]
+            lines.append(f"{';'.join(frames) or '<setup>'} {value}")
+        return lines
+
+
+def print_report(profiler, top=20):
+    total = profiler.estimator.seconds or 1.0
+    print(f"Estimated run time: {runtime.format_seconds(profiler.estimator.seconds)} (min:sec)")
+    print()
+    print("By function (total, self, moves):")
+    functions = sorted(profiler.by_function().items(), key=lambda item: -item[1][2])
+    for (filename, function), (own, _, seconds, moves) in functions[:top]:
+        print(f"  {runtime.format_seconds(seconds):>7} {100 * seconds / total:5.1f}%  "
+              f"{runtime.format_seconds(own):>7}  {moves:6}  {function} ({os.path.basename(filename)})")
+    print()
+    print("By line (self, moves):")
+    lines = sorted(profiler.by_line().items(), key=lambda item: -item[1][0])
+    for (filename, line), (seconds, moves) in lines[:top]:
+        source = linecache.getline(filename, line).strip()
+        print(f"  {runtime.format_seconds(seconds):>7} {100 * seconds / total:5.1f}%  {moves:6}  "
+              f"{os.path.basename(filename)}:{line}  {source}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Attribute a protocol's estimated robot time and gantry moves to its functions and source lines.")
+    parser.add_argument("file", help="The protocol script to profile.")
+    parser.add_argument("--collapsed", metavar="FILE", help="Write folded stacks for a flame graph to FILE.")
+    parser.add_argument("--metric", choices=METRICS, default="seconds", help="What --collapsed counts: robot milliseconds or gantry moves.")
+    parser.add_argument("--protocol-only", action="store_true", help="Charge time spent in helper modules to the protocol line that called them.")
+    parser.add_argument("--top", type=int, default=20, help="How many functions and lines to list.")
+    parser.add_argument("-L", "--custom-labware-path", action="append", default=[], help="A directory of extra labware definitions.  May be given more than once.")
+    args = parser.parse_args()
+
+    profiler = RobotProfiler(args.file, helpers=not args.protocol_only)
+    labware = simulation.load_labware_definitions(simulation.LABWARE_DIRS + args.custom_labware_path)
+    simulation.simulate(args.file, labware=labware, observers=[profiler])
+    print_report(profiler, args.top)
+    if args.collapsed:
+        with open(args.collapsed, "w") as f:
+            f.write("\n".join(profiler.collapsed(args.metric)) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""Reorder independent pipetting jobs to cut down gantry travel.
+
+Protocol scripts import this module, so it only uses the standard library.
+Positions are (x, y) deck coordinates in mm; the gantry's z moves are about
+the same whatever the order, so they are left out.
+"""
+
+import math
+
+# Gantry speed, as in runtime.RobotModel.
+XY_SPEED = 400.0
+
+
+def distance(a, b):
+    return math.hypot(b[0] - a[0], b[1] - a[1])
+
+
+def route_length(stops):
+    """Total distance travelled visiting stops in order."""
+    return sum(distance(a, b) for a, b in zip(stops, stops[1:]))
+
+
+def optimise_assignment(slots, jobs, cost):
+    """Pair each slot with a job, minimising the total cost(slot, job).
+
+    There must be at least as many slots as jobs.  Returns the jobs reordered
+    so that jobs[k] goes with slots[k].  Starts from the given order and
+    swaps pairs of jobs while that helps, which finds a local optimum quickly
+    for the ~100 jobs on a plate.
+    """
+    order = list(jobs)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(order)):
+            for j in range(i + 1, len(order)):
+                before = cost(slots[i], order[i]) + cost(slots[j], order[j])
+                after = cost(slots[i], order[j]) + cost(slots[j], order[i])
+                if after < before - 1e-9:
+                    order[i], order[j] = order[j], order[i]
+                    improved = True
+    return order
+
+
+def transfer_route(tips, transfers, trash):
+    """The stops a single-channel pipette makes doing one transfer per tip.
+
+    Each transfer is a (source, destination) pair of positions: pick up the
+    next tip, aspirate, dispense, and drop the tip in the trash.
+    """
+    stops = [trash]
+    for tip, (source, dest) in zip(tips, transfers):
+        stops += [tip, source, dest, trash]
+    return stops
+
+
+def optimise_transfers(tips, transfers, trash):
+    """Reorder (source, destination) transfers to shorten the route over tips.
+
+    Only the leg from each tip to its source depends on the order: every
+    transfer ends in the trash, and the tips are used in rack order.  So this
+    matches tips to sources, leaving each source with its destination.
+    Returns (order, mm saved), where order indexes into transfers.
+    """
+    order = optimise_assignment(
+        tips, list(range(len(transfers))),
+        lambda tip, job: distance(tip, transfers[job][0]))
+    saved = (route_length(transfer_route(tips, transfers, trash))
+             - route_length(transfer_route(tips, [transfers[job] for job in order], trash)))
+    return order, saved
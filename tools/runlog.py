@@ -0,0 +1,203 @@
+"""Typed, columnar run logs captured straight from a simulated protocol.
+
+The runlog that opentrons.simulate.simulate() returns is human-readable
+text, which is what notebooks/Well Simulate.ipynb has to regex apart.
+EventRecorder is a simulation observer (see simulation.py) that records the
+same liquid handling as typed events instead, and EventRecorder.table()
+packs them into an EventTable of NumPy arrays, one per column:
+
+    kind     which command, one of the constants below
+    pipette  an index into table.pipette_names
+    volume   uL, or 0 for commands that don't move liquid
+    labware  an index into table.labware_names, or -1
+    well     an index into table.well_names, or -1
+    slot     deck slot of the labware, or 0
+    tip      which physical tip the pipette was holding, or -1 with no tip:
+             a new number for every tip taken from a rack, except that a
+             tip returned to its rack keeps its number when it is picked
+             up again
+    depth    mm below the top of the well the command went to, so > 0 means
+             the tip was inside the well; 0 with no well
+    time     estimated robot seconds since the start (see runtime.py)
+
+For example:
+
+    recorder = runlog.EventRecorder()
+    simulation.simulate(path, observers=[recorder])
+    events = recorder.table()
+    aspirated = events.volume[events.kind == runlog.ASPIRATE].sum()
+"""
+
+import numpy as np
+# opentrons.simulate first: on 3.x, importing opentrons.commands first is a
+# circular import.
+import opentrons.simulate  # noqa: F401
+from opentrons.commands import types as command_types
+from opentrons.protocol_api.labware import Well
+
+import runtime
+import simulation
+
+KINDS = ['aspirate', 'dispense', 'blow_out', 'pick_up_tip', 'drop_tip']
+ASPIRATE, DISPENSE, BLOW_OUT, PICK_UP_TIP, DROP_TIP = range(len(KINDS))
+
+_COMMAND_KINDS = {
+    command_types.ASPIRATE: ASPIRATE,
+    command_types.DISPENSE: DISPENSE,
+    command_types.BLOW_OUT: BLOW_OUT,
+    command_types.PICK_UP_TIP: PICK_UP_TIP,
+    command_types.DROP_TIP: DROP_TIP,
+}
+
+COLUMNS = [
+    ('kind', np.int8),
+    ('pipette', np.int16),
+    ('volume', np.float64),
+    ('labware', np.int16),
+    ('well', np.int16),
+    ('slot', np.int8),
+    ('tip', np.int32),
+    ('depth', np.float64),
+    ('time', np.float64),
+]
+
+
+def labware_slot(labware):
+    """The deck slot a labware sits in, looking through any module it's on."""
+    parent = labware.parent
+    while parent is not None and not isinstance(parent, (str, int)):
+        parent = getattr(parent, 'parent', None)
+    return int(parent) if parent is not None else 0
+
+
+def location_depth(location, well):
+    """How far below the top of well a command at location goes, in mm."""
+    if isinstance(location, Well):
+        # A bare well means its bottom, for aspirate and dispense.
+        return well.top().point.z - well.bottom().point.z
+    return well.top().point.z - location.point.z
+
+
+class _Interner:
+    """Gives each distinct key a small integer id, remembering a name for it."""
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def __call__(self, key, name):
+        if key not in self.ids:
+            self.ids[key] = len(self.names)
+            self.names.append(name)
+        return self.ids[key]
+
+
+class EventTable:
+    """Events as parallel NumPy arrays, plus the names their ids refer to."""
+
+    def __init__(self, columns, pipette_names, labware_names, well_names):
+        for name, _ in COLUMNS:
+            setattr(self, name, columns[name])
+        self.pipette_names = pipette_names
+        self.labware_names = labware_names
+        self.well_names = well_names
+
+    def __len__(self):
+        return len(self.kind)
+
+    def describe(self, i):
+        """'A1 of <labware>' for event i, like the text runlog says it."""
+        if self.well[i] < 0:
+            return self.labware_names[self.labware[i]] if self.labware[i] >= 0 else ''
+        return '{} of {}'.format(self.well_names[self.well[i]], self.labware_names[self.labware[i]])
+
+    def volume_by_well(self, kind):
+        """Total volume of one kind of event into each (labware, well) pair."""
+        mask = (self.kind == kind) & (self.well >= 0)
+        keys = self.labware[mask].astype(np.int64) * len(self.well_names) + self.well[mask]
+        totals = np.bincount(keys, weights=self.volume[mask])
+        wells = np.nonzero(totals)[0]
+        return {(self.labware_names[key // len(self.well_names)],
+                 self.well_names[key % len(self.well_names)]): totals[key]
+                for key in wells}
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            pipette_names=np.array(self.pipette_names),
+            labware_names=np.array(self.labware_names),
+            well_names=np.array(self.well_names),
+            **{name: getattr(self, name) for name, _ in COLUMNS})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                {name: data[name] for name, _ in COLUMNS},
+                list(data['pipette_names']), list(data['labware_names']),
+                list(data['well_names']))
+
+
+class EventRecorder:
+    """Simulation observer that records liquid handling as typed events."""
+
+    def __init__(self):
+        self._columns = {name: [] for name, _ in COLUMNS}
+        self._pipettes = _Interner()
+        self._labware = _Interner()
+        self._wells = _Interner()
+        self._tips = {}
+        self._next_tip = 0
+        # {(tip rack, well name): tip} for tips returned to their rack.
+        self._returned = {}
+        self._clock = runtime.RuntimeEstimator()
+
+    def __call__(self, message):
+        time = self._clock.seconds
+        self._clock(message)
+        if not simulation.is_primitive(message) or message['name'] not in _COMMAND_KINDS:
+            return
+        kind = _COMMAND_KINDS[message['name']]
+        payload = message['payload']
+        instrument = payload['instrument']
+        pipette = self._pipettes(id(instrument), str(instrument))
+
+        location = payload.get('location')
+        labware = runtime.location_labware(location)
+        well = runtime.location_well(location)
+        rack_well = None
+        if well is not None and getattr(labware, 'is_tiprack', False):
+            rack_well = (str(labware), well.display_name.split(' ')[0])
+
+        if kind == PICK_UP_TIP:
+            if rack_well in self._returned:
+                self._tips[pipette] = self._returned.pop(rack_well)
+            else:
+                self._tips[pipette] = self._next_tip
+                self._next_tip += 1
+        tip = self._tips.get(pipette, -1)
+        if kind == DROP_TIP:
+            self._tips.pop(pipette, None)
+            if rack_well is not None and tip >= 0:
+                self._returned[rack_well] = tip
+
+        columns = self._columns
+        columns['kind'].append(kind)
+        columns['pipette'].append(pipette)
+        columns['volume'].append(payload.get('volume') or 0)
+        columns['labware'].append(self._labware(str(labware), str(labware)) if labware is not None else -1)
+        if well is not None:
+            # A well's display name is "A1 of <labware>".
+            well_name = well.display_name.split(' ')[0]
+            columns['well'].append(self._wells(well_name, well_name))
+        else:
+            columns['well'].append(-1)
+        columns['slot'].append(labware_slot(labware) if labware is not None else 0)
+        columns['tip'].append(tip)
+        columns['depth'].append(location_depth(location, well) if well is not None else 0.0)
+        columns['time'].append(time)
+
+    def table(self):
+        return EventTable(
+            {name: np.array(self._columns[name], dtype=dtype) for name, dtype in COLUMNS},
+            list(self._pipettes.names), list(self._labware.names), list(self._wells.names))
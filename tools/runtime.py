@@ -0,0 +1,258 @@
+"""Deterministic wall-clock run time estimates for protocol scripts.
+
+RuntimeEstimator is a simulation observer (see simulation.py).  It follows
+the pipette around the deck and charges each primitive command for:
+
+* gantry travel from the previous position, arcing over labware when the
+  pipette leaves a well,
+* plunger travel at the flow rate the script has set when the command runs,
+* fixed costs for tip pick-up, tip drop, blow-out and module actions,
+* every protocol.delay().
+
+Time is attributed to the phase named by the most recent protocol.comment(),
+which is how our scripts already mark their steps.
+
+Usage: python tools/runtime.py path/to/protocol.py [--baseline path/to/other.py]
+"""
+
+import argparse
+import math
+from collections import OrderedDict
+
+# opentrons.simulate first: on 3.x, importing opentrons.commands first is a
+# circular import.
+import opentrons.simulate  # noqa: F401
+from opentrons.commands import types as command_types
+from opentrons.protocol_api.labware import Labware, Well
+
+import simulation
+
+
+class RobotModel:
+    """Speeds and fixed costs for an OT-2.  Distances in mm, times in seconds."""
+
+    xy_speed = 400.0
+    z_speed = 125.0
+    # Settling and acceleration overhead paid by every separate move.
+    move_overhead = 0.3
+    # How far above the taller of the two labware an arc travels, including the tip.
+    arc_clearance = 60.0
+    pick_up_tip = 3.5
+    drop_tip = 2.5
+    blow_out = 1.0
+    touch_tip = 2.0
+    home = 8.0
+    magdeck_engage = 5.0
+    magdeck_disengage = 3.0
+    # The temperature module blocks until it reaches its target.
+    ambient_celsius = 25.0
+    tempdeck_degrees_per_second = 0.1
+
+
+def location_point(location):
+    """The deck coordinates a command moves to, or None if it doesn't move."""
+    if location is None:
+        return None
+    if isinstance(location, Well):
+        return location.top().point
+    return location.point
+
+
+def location_parent(location):
+    """What a Location is in: a Well, a Labware, or None.
+
+    From opentrons 4.2 Location.labware is a LabwareLike wrapping it.
+    """
+    parent = location.labware
+    return getattr(parent, "object", parent)
+
+
+def location_labware(location):
+    """The labware a command moves into, or None."""
+    if location is None:
+        return None
+    if isinstance(location, (Well, Labware)):
+        parent = location
+    else:
+        parent = location_parent(location)
+    if isinstance(parent, Well):
+        parent = parent.parent
+    return parent
+
+
+def location_well(location):
+    """The well a command moves into, or None."""
+    if isinstance(location, Well):
+        return location
+    if location is not None and isinstance(location_parent(location), Well):
+        return location_parent(location)
+    return None
+
+
+class RuntimeEstimator:
+    """Simulation observer that estimates how long a real robot takes."""
+
+    def __init__(self, model=RobotModel):
+        self.model = model
+        self.phase = "Setup"
+        self.phases = OrderedDict()
+        self.kinds = OrderedDict()
+        self.travel_mm = 0.0
+        self._position = None
+        self._labware = None
+        self._well = None
+        self._handlers = {
+            command_types.ASPIRATE: self._aspirate,
+            command_types.DISPENSE: self._dispense,
+            command_types.BLOW_OUT: self._blow_out,
+            command_types.PICK_UP_TIP: self._pick_up_tip,
+            command_types.DROP_TIP: self._drop_tip,
+            command_types.TOUCH_TIP: self._touch_tip,
+            command_types.DELAY: self._delay,
+            command_types.COMMENT: self._comment,
+            command_types.HOME: self._home,
+            command_types.MAGDECK_ENGAGE: self._magdeck_engage,
+            command_types.MAGDECK_DISENGAGE: self._magdeck_disengage,
+            command_types.TEMPDECK_SET_TEMP: self._tempdeck_set_temp,
+        }
+        # move_to() only publishes a command from opentrons 4.4.
+        if hasattr(command_types, "MOVE_TO"):
+            self._handlers[command_types.MOVE_TO] = self._move_to
+
+    @property
+    def seconds(self):
+        return sum(self.phases.values())
+
+    def __call__(self, message):
+        if simulation.is_primitive(message) and message["name"] in self._handlers:
+            self._handlers[message["name"]](message["payload"])
+
+    def charge(self, kind, seconds):
+        self.phases[self.phase] = self.phases.get(self.phase, 0.0) + seconds
+        self.kinds[kind] = self.kinds.get(kind, 0.0) + seconds
+
+    def travel_seconds(self, start, end, arc_height=None):
+        """Seconds to move between two points, optionally arcing up to arc_height."""
+        model = self.model
+        xy = math.hypot(end.x - start.x, end.y - start.y)
+        if arc_height is None:
+            dz = abs(end.z - start.z)
+            self.travel_mm += math.hypot(xy, dz)
+            return max(xy / model.xy_speed, dz / model.z_speed) + model.move_overhead
+        up = max(0.0, arc_height - start.z)
+        down = max(0.0, arc_height - end.z)
+        self.travel_mm += up + xy + down
+        return (up + down) / model.z_speed + xy / model.xy_speed + model.move_overhead
+
+    def move(self, location):
+        end = location_point(location)
+        if end is None:
+            return
+        labware = location_labware(location)
+        well = location_well(location)
+        if self._position is None:
+            seconds = self.model.move_overhead
+        elif well is not None and well is self._well:
+            # Moves within a well go straight there.
+            seconds = self.travel_seconds(self._position, end)
+        else:
+            heights = [lw.highest_z for lw in (self._labware, labware) if lw is not None]
+            arc_height = max(heights + [self._position.z, end.z]) + self.model.arc_clearance
+            seconds = self.travel_seconds(self._position, end, arc_height)
+        self._position, self._labware, self._well = end, labware, well
+        self.charge("travel", seconds)
+
+    def plunger(self, payload, flow_rate):
+        rate = payload.get("rate") or 1.0
+        if payload["volume"]:
+            self.charge("plunger", payload["volume"] / (flow_rate * rate))
+
+    def _aspirate(self, payload):
+        self.move(payload["location"])
+        self.plunger(payload, payload["instrument"].flow_rate.aspirate)
+
+    def _dispense(self, payload):
+        self.move(payload["location"])
+        self.plunger(payload, payload["instrument"].flow_rate.dispense)
+
+    def _blow_out(self, payload):
+        self.move(payload.get("location"))
+        self.charge("plunger", self.model.blow_out)
+
+    def _pick_up_tip(self, payload):
+        self.move(payload["location"])
+        self.charge("tips", self.model.pick_up_tip)
+
+    def _drop_tip(self, payload):
+        self.move(payload["location"])
+        self.charge("tips", self.model.drop_tip)
+
+    def _move_to(self, payload):
+        self.move(payload["location"])
+
+    def _touch_tip(self, payload):
+        self.charge("travel", self.model.touch_tip)
+
+    def _delay(self, payload):
+        self.charge("delays", 60 * (payload.get("minutes") or 0) + (payload.get("seconds") or 0))
+
+    def _comment(self, payload):
+        self.phase = payload["text"]
+
+    def _home(self, payload):
+        self._position = self._labware = self._well = None
+        self.charge("travel", self.model.home)
+
+    def _magdeck_engage(self, payload):
+        self.charge("modules", self.model.magdeck_engage)
+
+    def _magdeck_disengage(self, payload):
+        self.charge("modules", self.model.magdeck_disengage)
+
+    def _tempdeck_set_temp(self, payload):
+        delta = abs(payload["celsius"] - self.model.ambient_celsius)
+        self.charge("modules", delta / self.model.tempdeck_degrees_per_second)
+
+
+def format_seconds(seconds):
+    sign = "-" if seconds < 0 else ""
+    minutes, seconds = divmod(int(round(abs(seconds))), 60)
+    return f"{sign}{minutes}:{seconds:02d}"
+
+
+def print_report(estimator):
+    total = estimator.seconds
+    print(f"Estimated run time: {format_seconds(total)} (min:sec)")
+    total = total or 1.0
+    print()
+    print("By phase:")
+    for phase, seconds in estimator.phases.items():
+        print(f"  {format_seconds(seconds):>7}  {100 * seconds / total:5.1f}%  {phase}")
+    print()
+    print("By kind of work:")
+    for kind, seconds in estimator.kinds.items():
+        print(f"  {format_seconds(seconds):>7}  {100 * seconds / total:5.1f}%  {kind}")
+
+
+def estimate(path):
+    estimator = RuntimeEstimator()
+    simulation.simulate(path, observers=[estimator])
+    return estimator
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate how long an Opentrons Python Protocol API script takes to run on a robot.")
+    parser.add_argument("file", help="The protocol script to estimate.")
+    parser.add_argument("--baseline", help="Another version of the protocol to compare against, e.g. the strictly serial original.")
+    args = parser.parse_args()
+
+    estimator = estimate(args.file)
+    print_report(estimator)
+    if args.baseline:
+        baseline = estimate(args.baseline).seconds
+        print()
+        print(f"Baseline {args.baseline}: {format_seconds(baseline)}")
+        print(f"Saved: {format_seconds(baseline - estimator.seconds)} ({100 * (baseline - estimator.seconds) / baseline:.1f}%)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Fill incubation windows with work that doesn't depend on the incubating samples.
+
+Protocol scripts import this module, so it must be importable on the robot
+as well as in simulation (see the README).
+
+A protocol registers independent tasks with an IncubationScheduler up front,
+each with an estimate of how long it takes (tools/runtime.py gives you one).
+Wherever the script used to call protocol.delay() to wait for beads to
+pellet, it calls scheduler.incubate() instead: that runs whichever pending
+tasks fit in the window, then delays for whatever time is left, so the
+samples on the magnet still wait exactly as long as before.  Before a step
+that needs a task's result, the script calls scheduler.require(task), which
+runs the task then and there if no window had room for it.
+
+A run resumed from a checkpoint skips steps, and with them their windows.
+The script passes those windows to scheduler.skip(), which takes the tasks
+a full run would have fitted in them as done, so none runs twice.
+"""
+
+import time
+
+
+class Task:
+    def __init__(self, name, action, seconds):
+        self.name = name
+        self.action = action
+        self.seconds = seconds
+        self.done = False
+
+
+class IncubationScheduler:
+    """Runs registered tasks inside incubation delays.
+
+    With overlap=False every task runs when it is required, as in a strictly
+    serial script, which makes it easy to compare the two.  margin pads each
+    task's estimate when deciding whether it fits in a window, because on a
+    real robot an overrun lengthens the incubation.
+    """
+
+    def __init__(self, protocol, overlap=True, margin=0.2):
+        self._protocol = protocol
+        self._overlap = overlap
+        self._margin = margin
+        self._pending = []
+        self.overlapped_seconds = 0.0
+
+    def add(self, name, action, seconds):
+        task = Task(name, action, seconds)
+        self._pending.append(task)
+        return task
+
+    def require(self, task):
+        if not task.done:
+            self._execute(task)
+
+    def cancel(self, task):
+        """Never run task, e.g. because an earlier run already did it."""
+        if task in self._pending:
+            self._pending.remove(task)
+        task.done = True
+
+    def skip(self, *windows):
+        """Take the tasks incubate() would fit in these windows as done.
+
+        windows are in seconds, in the order a full run incubates them.
+        """
+        for window in windows:
+            for task in self._fit(window):
+                self.cancel(task)
+
+    def incubate(self, minutes=0, seconds=0, msg=None):
+        window = 60 * minutes + seconds
+        if msg:
+            self._protocol.comment(msg)
+        start = time.monotonic()
+        planned = 0.0
+        for task in self._fit(window):
+            self._execute(task)
+            planned += task.seconds
+            self.overlapped_seconds += task.seconds
+        # A simulated robot doesn't take any real time, so trust the estimates.
+        if self._protocol.is_simulating():
+            elapsed = planned
+        else:
+            elapsed = time.monotonic() - start
+        if window - elapsed > 0:
+            self._protocol.delay(seconds=window - elapsed)
+
+    def report(self):
+        self._protocol.comment(
+            'Incubation windows absorbed {:.0f} seconds of other work.'.format(
+                self.overlapped_seconds))
+
+    def _fit(self, window):
+        """The pending tasks that fit in a window, in the order added."""
+        if not self._overlap:
+            return []
+        tasks = []
+        planned = 0.0
+        for task in self._pending:
+            if planned + task.seconds * (1 + self._margin) > window:
+                continue
+            tasks.append(task)
+            planned += task.seconds
+        return tasks
+
+    def _execute(self, task):
+        self._pending.remove(task)
+        task.action()
+        task.done = True
@@ -1,35 +1,143 @@
 import argparse
-import opentrons.simulate
-import opentrons.protocol_api.labware
+import html
 import json
-import urllib
+import multiprocessing
+import os
+import urllib.parse
 
-def is_labware(maybe_labware):
-    return isinstance(maybe_labware, opentrons.protocol_api.labware.Labware)
+import numpy as np
 
-parser = argparse.ArgumentParser(description="Simulate an Opentrons Python Protocol API script and print a protocol-library-kludge URL to get its deck map.")
-parser.add_argument("file", type=argparse.FileType())
-args = parser.parse_args()
+import geometry
+import simulation
 
-# Compile the code to exec to preserve its filename, for clearer error messages.
-code = compile(args.file.read(), args.file.name, "exec", dont_inherit=True)
-exec_globals = {}
-exec(code, exec_globals)
+# OT-2 deck geometry, in mm.  Slot 1 is front left, slot 12 back right.
+SLOT_WIDTH = 127.76
+SLOT_HEIGHT = 85.48
+SLOT_PITCH_X = 132.5
+SLOT_PITCH_Y = 90.5
+MARGIN = 10
+DECK_WIDTH = 2 * SLOT_PITCH_X + SLOT_WIDTH + 2 * MARGIN
+DECK_HEIGHT = 3 * SLOT_PITCH_Y + SLOT_HEIGHT + 2 * MARGIN
 
-context = opentrons.simulate.get_protocol_api(exec_globals["metadata"]["apiLevel"])
-exec_globals["run"](context)
+# Set in each worker process by init_worker().
+CUSTOM_LABWARE = {}
 
-labware_slots = {slot: maybe_labware for slot, maybe_labware in context.deck.items() if is_labware(maybe_labware)}
-labware_spec = {int(slot): {"labwareType": labware.load_name, "name": ""} for slot, labware in labware_slots.items()}
 
-# This expects you to be running a local protocol-library-kludge server.
-# See: https://github.com/Opentrons/opentrons/tree/0adc97e070ec377047ef1c36ad5bc2739f19111d/protocol-library-kludge
-print("localhost:8080?data="+urllib.parse.quote(json.dumps({"labware": labware_spec})))
+def deck_items(context):
+    """Yield (slot, labware, module) for every slot with either in it.
 
-# To do:
-# - Support custom labware in this script with a -L option.  See opentrons_simulate.
-# - Copy the protocol-library-kludge source into this repo.
-# - Teach it to display our custom labware.
-# - Change it to show the labware names all the time, not just on hover?
-# - Have it output just the SVG, not an HTML page.
-# - Automatically run the server and save the file from this script.
\ No newline at end of file
+    module is None for labware straight on the deck, and labware is None
+    for an empty module.  (context.deck isn't used because from opentrons
+    4.x it holds implementation objects rather than Labware.)
+    """
+    labwares, modules = context.loaded_labwares, context.loaded_modules
+    for slot in sorted(set(labwares) | set(modules)):
+        yield int(slot), labwares.get(slot), modules.get(slot)
+
+
+def labware_offset(module):
+    """(x, y) of a module's labware from its slot's front left corner, in mm."""
+    offset = module.geometry.labware_offset
+    return offset.x, offset.y
+
+
+def slot_origin(slot):
+    """SVG coordinates of a slot's back left corner."""
+    column, row = (slot - 1) % 3, (slot - 1) // 3
+    return MARGIN + column * SLOT_PITCH_X, MARGIN + (3 - row) * SLOT_PITCH_Y
+
+
+def render_wells(shape, left, front):
+    """SVG elements for every well of a labware whose front left corner is at (left, front)."""
+    centers = np.column_stack((left + shape.centers[:, 0], front - shape.centers[:, 1]))
+    circles = np.column_stack((centers, shape.sizes[:, 0] / 2))[shape.circular]
+    rects = np.column_stack((centers - shape.sizes / 2, shape.sizes))[~shape.circular]
+    return [
+        *(f'<circle cx="{cx:.1f}" cy="{cy:.1f}" r="{r:.2f}" fill="none" stroke="#888" stroke-width="0.4"/>'
+          for cx, cy, r in circles.tolist()),
+        *(f'<rect x="{x:.1f}" y="{y:.1f}" width="{w}" height="{h}" fill="none" stroke="#888" stroke-width="0.4"/>'
+          for x, y, w, h in rects.tolist()),
+    ]
+
+
+def render_svg(context, title):
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {DECK_WIDTH:.1f} {DECK_HEIGHT + 12:.1f}" font-family="sans-serif">',
+        f'<text x="{MARGIN}" y="{DECK_HEIGHT + 6:.1f}" font-size="6">{html.escape(title)}</text>',
+    ]
+    for slot in range(1, 13):
+        x, y = slot_origin(slot)
+        parts.append(f'<rect x="{x:.1f}" y="{y:.1f}" width="{SLOT_WIDTH}" height="{SLOT_HEIGHT}" fill="#f2f2f2" stroke="#ccc"/>')
+        parts.append(f'<text x="{x + 2:.1f}" y="{y + SLOT_HEIGHT - 2:.1f}" font-size="5" fill="#999">{slot}</text>')
+
+    for slot, labware, module in deck_items(context):
+        x, y = slot_origin(slot)
+        label = []
+        if module:
+            parts.append(f'<rect x="{x:.1f}" y="{y:.1f}" width="{SLOT_WIDTH}" height="{SLOT_HEIGHT}" fill="#dde6f0" stroke="#7a93b0"/>')
+            label.append(str(module.geometry))
+        if labware is not None:
+            shape = geometry.for_uri(labware.uri, CUSTOM_LABWARE)
+            width, height = shape.dimensions[:2]
+            # Labware y runs from front to back; SVG y runs down the page.
+            dx, dy = labware_offset(module) if module else (0.0, 0.0)
+            left, front = x + dx, y + SLOT_HEIGHT - dy
+            parts.append(f'<rect x="{left:.1f}" y="{front - height:.1f}" width="{width}" height="{height}" fill="#fff" stroke="#555"/>')
+            parts.extend(render_wells(shape, left, front))
+            label.insert(0, str(labware))
+        for i, line in enumerate(label):
+            parts.append(f'<text x="{x + SLOT_WIDTH / 2:.1f}" y="{y + SLOT_HEIGHT / 2 + 7 * i:.1f}" font-size="5" text-anchor="middle" fill="#000" stroke="#fff" stroke-width="1.5" paint-order="stroke">{html.escape(line)}</text>')
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+
+def kludge_url(context):
+    labware_slots = {slot: labware for slot, labware, module in deck_items(context) if labware is not None and module is None}
+    labware_spec = {slot: {"labwareType": labware.load_name, "name": ""} for slot, labware in labware_slots.items()}
+    # This expects you to be running a local protocol-library-kludge server.
+    # See: https://github.com/Opentrons/opentrons/tree/0adc97e070ec377047ef1c36ad5bc2739f19111d/protocol-library-kludge
+    return "localhost:8080?data=" + urllib.parse.quote(json.dumps({"labware": labware_spec}))
+
+
+def render_one(job):
+    path, output = job
+    try:
+        # Only the deck setup is needed, so don't pipette the whole run.
+        context = simulation.simulate(path, labware=CUSTOM_LABWARE, setup_only=True)
+    except Exception as e:
+        return path, f"simulation failed: {e!r}"
+    if output is None:
+        return path, kludge_url(context)
+    with open(output, "w", encoding="utf-8") as f:
+        f.write(render_svg(context, os.path.relpath(path, simulation.REPO_ROOT)))
+    return path, output
+
+
+def init_worker(custom_labware):
+    global CUSTOM_LABWARE
+    CUSTOM_LABWARE = custom_labware
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate Opentrons Python Protocol API scripts and draw their deck maps as SVG files.")
+    parser.add_argument("paths", nargs="+", help="Protocol files, or directories to search for protocols.")
+    parser.add_argument("-o", "--output", default="deck-maps", help="Directory to write the SVG files into.")
+    parser.add_argument("-L", "--custom-labware-path", action="append", default=[], help="A directory of extra labware definitions, as for opentrons_simulate.  May be given more than once.")
+    parser.add_argument("--kludge", action="store_true", help="Print a protocol-library-kludge URL for each protocol instead of writing SVG.")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Number of worker processes.  Defaults to one per core.")
+    args = parser.parse_args()
+
+    paths = [p for p in args.paths if os.path.isfile(p)]
+    paths += simulation.find_protocols([p for p in args.paths if os.path.isdir(p)])
+    if not args.kludge:
+        os.makedirs(args.output, exist_ok=True)
+    jobs = [(path, None if args.kludge else os.path.join(args.output, simulation.output_name(path, ".svg")))
+            for path in paths]
+
+    with multiprocessing.Pool(args.jobs, init_worker, (simulation.load_labware_definitions(simulation.LABWARE_DIRS + args.custom_labware_path),)) as pool:
+        for path, result in pool.imap(render_one, jobs):
+            print(f"{path}: {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+# opentrons.simulate first: on 3.x, importing opentrons.commands first is a
+# circular import.
+import opentrons.simulate  # noqa: F401
+from opentrons.commands import types as command_types
+
+import provenance
+import runlog
+import runtime
+import simulation
+
+parser = argparse.ArgumentParser(description="Simulate every protocol script in this repository in parallel and write a JSON summary for each.")
+parser.add_argument("paths", nargs="*", help="Protocol files or directories to search.  Defaults to protocols/ and experiments/.")
+parser.add_argument("-o", "--output", default="simulation-results", help="Directory to write the per-protocol JSON summaries into.")
+parser.add_argument("-L", "--custom-labware-path", action="append", default=[], help="A directory of extra labware definitions, as for opentrons_simulate.  May be given more than once.")
+parser.add_argument("--samples", metavar="LABWARE", help="Also check that no well gets material from two wells of the labware named like this, e.g. \"Elution Plate\".")
+parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Number of worker processes.  Defaults to one per core.")
+
+# Set in each worker process by init_worker().
+LABWARE = None
+SAMPLES = None
+
+
+def simulate_one(path):
+    counter = simulation.CommandCounter()
+    estimator = runtime.RuntimeEstimator()
+    observers = [counter, estimator]
+    if SAMPLES:
+        recorder = runlog.EventRecorder()
+        observers.append(recorder)
+    start = time.monotonic()
+    try:
+        simulation.simulate(path, labware=LABWARE, observers=observers)
+    except Exception:
+        error = traceback.format_exc()
+    else:
+        error = None
+    summary = {
+        "protocol": os.path.relpath(path, simulation.REPO_ROOT),
+        "success": error is None,
+        "error": error,
+        "steps": counter.steps,
+        "tips": counter.tips,
+        "aspirates": counter.counts.get(command_types.ASPIRATE, 0),
+        "dispenses": counter.counts.get(command_types.DISPENSE, 0),
+        "travel_mm": round(estimator.travel_mm),
+        "delay_seconds": round(estimator.kinds.get("delays", 0.0), 1),
+        "estimated_seconds": round(estimator.seconds, 1),
+        "estimated_phases": {phase: round(seconds, 1) for phase, seconds in estimator.phases.items()},
+        "simulation_seconds": round(time.monotonic() - start, 2),
+    }
+    if SAMPLES and error is None:
+        summary["mixed_sources"] = provenance.ProvenanceIndex(recorder.table()).mixed_sources(SAMPLES)
+    return summary
+
+
+def init_worker(labware, samples):
+    # Each worker parses the labware definitions once, not once per protocol.
+    global LABWARE, SAMPLES
+    LABWARE = labware
+    SAMPLES = samples
+
+
+def main():
+    args = parser.parse_args()
+
+    roots = [p for p in args.paths if os.path.isdir(p)]
+    paths = [os.path.abspath(p) for p in args.paths if os.path.isfile(p)]
+    if roots or not args.paths:
+        paths += simulation.find_protocols(roots or simulation.PROTOCOL_DIRS)
+
+    os.makedirs(args.output, exist_ok=True)
+    failures = 0
+    with multiprocessing.Pool(args.jobs, init_worker, (simulation.load_labware_definitions(simulation.LABWARE_DIRS + args.custom_labware_path), args.samples)) as pool:
+        for summary in pool.imap_unordered(simulate_one, paths):
+            with open(os.path.join(args.output, simulation.output_name(summary["protocol"], ".json")), "w") as f:
+                json.dump(summary, f, indent=2)
+            status = "ok  " if summary["success"] else "FAIL"
+            print(f"{status} {summary['protocol']}: {summary['steps']} steps, {summary['tips']} tips, ~{summary['estimated_seconds'] / 60:.0f} min")
+            failures += not summary["success"]
+            if summary.get("mixed_sources"):
+                print(f"     {len(summary['mixed_sources'])} wells get material from more than one well of {args.samples}")
+                failures += summary["success"]
+
+    print(f"{len(paths) - failures}/{len(paths)} protocols simulated successfully and passed their checks.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Shared helpers for simulating this repository's protocol scripts.
+
+The command-line tools in this directory all follow the same recipe as
+scrape_labware.py: compile the script under its own filename, build a
+simulating ProtocolContext with our custom labware available, and call the
+script's run().  Anything that wants to watch the run subscribes an observer
+to the context's command broker; an observer is just a callable that
+receives every broker message.
+"""
+
+import glob
+import os
+
+import opentrons.simulate
+from opentrons.commands import types as command_types
+
+import labware_registry
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROTOCOL_DIRS = [os.path.join(REPO_ROOT, "protocols"), os.path.join(REPO_ROOT, "experiments")]
+LABWARE_DIRS = [os.path.join(REPO_ROOT, "labware")]
+
+# Commands that only wrap other commands.  Their children are published
+# separately, so counting these too would count the same work twice.
+COMPOSITE_COMMANDS = {
+    command_types.TRANSFER,
+    command_types.DISTRIBUTE,
+    command_types.CONSOLIDATE,
+    command_types.MIX,
+    command_types.AIR_GAP,
+    command_types.RETURN_TIP,
+}
+
+
+def find_protocols(roots=PROTOCOL_DIRS):
+    """Yield the path of every protocol script (a .py file with a run()) under roots."""
+    for root in roots:
+        for path in sorted(glob.glob(os.path.join(root, "**", "*.py"), recursive=True)):
+            with open(path, encoding="utf-8") as f:
+                source = f.read()
+            if "def run(" in source and "metadata" in source:
+                yield path
+
+
+def output_name(path, extension):
+    """A flat file name for results about a protocol, unique across the repository."""
+    relative = os.path.relpath(path, REPO_ROOT)
+    return os.path.splitext(relative)[0].replace(os.sep, "__") + extension
+
+
+def load_labware_definitions(dirs=LABWARE_DIRS):
+    """Return {uri: definition} for every labware definition JSON file in dirs.
+
+    Definitions come from labware_registry, so each file is only parsed when
+    it has changed.
+    """
+    return labware_registry.load(dirs)
+
+
+def load_protocol(path, constants=None):
+    """Exec a protocol script and return its globals (metadata, run, constants...).
+
+    constants overrides the script's own top-level constants, such as
+    NUM_SAMPLES, before anything runs.
+    """
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    # Compile the code to exec to preserve its filename, for clearer error messages.
+    code = compile(source, path, "exec", dont_inherit=True)
+    exec_globals = {"__file__": path, "__name__": "__protocol__"}
+    exec(code, exec_globals)
+    exec_globals.update(constants or {})
+    return exec_globals
+
+
+class SetupFinished(Exception):
+    """Stops a setup-only simulation at the protocol's first pipette command."""
+
+
+def stop_at_first_pipette_command(message):
+    if message["$"] == "before" and "instrument" in message["payload"]:
+        raise SetupFinished()
+
+
+def simulate(path, labware=None, observers=(), constants=None, setup_only=False):
+    """Simulate the protocol at path and return its ProtocolContext.
+
+    labware is a {uri: definition} dict of extra labware, defaulting to the
+    definitions in this repository's labware directory.  Each observer is
+    subscribed to command messages for the duration of the run.  constants
+    overrides the script's constants, as for load_protocol().  setup_only
+    stops the run at the first pipette command, by when our scripts have
+    loaded their labware and modules.
+    """
+    if labware is None:
+        labware = load_labware_definitions()
+    exec_globals = load_protocol(path, constants)
+    context = opentrons.simulate.get_protocol_api(
+        exec_globals["metadata"]["apiLevel"], extra_labware=labware)
+    if setup_only:
+        observers = list(observers) + [stop_at_first_pipette_command]
+    unsubscribers = [context.broker.subscribe(command_types.COMMAND, observer) for observer in observers]
+    try:
+        exec_globals["run"](context)
+    except SetupFinished:
+        pass
+    finally:
+        for unsubscribe in unsubscribers:
+            unsubscribe()
+    return context
+
+
+def is_primitive(message):
+    """Whether a broker message starts a command that does work itself."""
+    return message["$"] == "before" and message["name"] not in COMPOSITE_COMMANDS
+
+
+class CommandCounter:
+    """Observer that tallies primitive commands by name."""
+
+    def __init__(self):
+        self.counts = {}
+
+    def __call__(self, message):
+        if is_primitive(message):
+            self.counts[message["name"]] = self.counts.get(message["name"], 0) + 1
+
+    @property
+    def steps(self):
+        return sum(self.counts.values())
+
+    @property
+    def tips(self):
+        return self.counts.get(command_types.PICK_UP_TIP, 0)
+
@@ -0,0 +1,393 @@
+"""Shared Station C qPCR setup: parse the plate maps, compile a transfer plan, run it.
+
+Station C scripts are thin layout files.  They define their metadata and
+the constants below, then hand everything to this module:
+
+    import stationc
+
+    def run(protocol):
+        stationc.run(protocol, globals())
+
+Required constants: QPCR_LABWARE, MASTER_MIX_MAP, SAMPLE_MAP and
+REAGENT_LOCATIONS.  Everything else defaults to the deck layout in
+protocols/station-C-qpcr-map.py; see DEFAULTS.
+
+compile_plan() doesn't touch the robot, so the simulation and timing tools
+can read a layout's plan without running anything.  Plans are cached on the
+maps' contents, like the parsed maps themselves (see plate_map.py).
+"""
+
+import argparse
+import functools
+import itertools
+
+import plate_map
+import routing
+
+DEFAULTS = {
+    'MIX_VOLUME': 15,
+    'SAMPLE_VOLUME': 5,
+    'SAMPLE_TIP_LOCATIONS': ['2', '3'],
+    'TEMPDECK_SLOT': '4',
+    'TEMPERATURE': 4,
+    'REAGENT_RACK_LABWARE': 'opentrons_24_tuberack_nest_1.5ml_snapcap',
+    'REAGENT_RACK_SLOT': '5',
+    'ELUTION_LABWARE': 'nest_96_wellplate_100ul_pcr_full_skirt',
+    'ELUTION_LABWARE_NAME': 'Elution Plate',
+    # Distribute master mix, several aliquots per aspirate, instead of one
+    # transfer per well.  A 20 uL tip only holds one 15 uL aliquot, so this
+    # loads a bigger pipette for the master mixes.
+    'MASTER_MIX_DISTRIBUTE': False,
+    'MASTER_MIX_PIPETTE': 'p50_single',
+    'MASTER_MIX_PIPETTE_MOUNT': 'left',
+    'MASTER_MIX_TIP_RACK': 'opentrons_96_filtertiprack_200ul',
+    'MASTER_MIX_TIP_LOCATION': '6',
+    'MASTER_MIX_MAX_VOLUME': 50,
+    'DISPOSAL_VOLUME': 5,
+    # Reorder sample transfers to shorten the gantry's path.  Each sample
+    # still goes to the well the map says.
+    'OPTIMISE_ROUTE': False,
+    # Move whole columns of samples with an 8-channel p20 when the sample map
+    # lines up with the elution plate's columns.  Other samples and the
+    # controls still go one at a time with the single-channel p20.
+    'SAMPLE_MULTICHANNEL': False,
+    'MULTI_PIPETTE': 'p20_multi_gen2',
+    'MULTI_PIPETTE_MOUNT': 'left',
+    'MULTI_TIP_LOCATIONS': ['7'],
+}
+
+
+class Plan:
+    """What Station C does, independent of any robot.
+
+    Wells are indexes into the qPCR plate, row by row (A1=0, A2=1, ...).
+
+    master_mix maps each master mix to the wells that get it, in map order.
+    samples lists (source, well) pairs in map order, where source is either
+    ('sample', n) for well n of the elution plate or ('reagent', tube).
+    """
+
+    def __init__(self, master_mix, samples):
+        self.master_mix = master_mix
+        self.samples = samples
+
+
+def compile_plan(master_mix_map, sample_map, reagent_locations):
+    return _compile_plan(
+        master_mix_map, sample_map, tuple(sorted(reagent_locations.items())))
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_plan(master_mix_map, sample_map, reagent_locations):
+    reagent_locations = dict(reagent_locations)
+
+    master_mix = {}
+    for mix, wells in plate_map.parse(master_mix_map).wells_by_label.items():
+        if mix not in reagent_locations:
+            raise ValueError(f'No reagent location for master mix "{mix}"')
+        master_mix[mix] = wells
+
+    samples = []
+    sample_labels = plate_map.parse(sample_map)
+    for well, sample in sample_labels.wells():
+        # Determine whether we are dealing with an actual sample, which we
+        # will take from the input sample plate; or a control, which we will
+        # take from a location on the reagent rack. We expect samples to be
+        # numbered, and will take the sample from the well matching the sample
+        # number (eg Sample 1 = well 1 = plate.wells()[0])
+        if sample in sample_labels.sample_numbers:
+            samples.append((('sample', sample_labels.sample_numbers[sample] - 1), well))
+        elif sample in reagent_locations:
+            samples.append((('reagent', reagent_locations[sample]), well))
+        else:
+            raise ValueError(f'No reagent location for sample "{sample}"')
+
+    return Plan(master_mix, tuple(samples))
+
+
+def column_transfers(plan):
+    """Split the sample transfers into whole columns and everything else.
+
+    A destination column can go in one 8-channel transfer when all eight of
+    its wells get samples from one elution plate column, in the same row
+    order.  Returns a list of (source column, destination column) pairs and
+    the (source, well) transfers left over for the single-channel pipette.
+    """
+    by_column = {}
+    for (kind, source), well in plan.samples:
+        row, column = divmod(well, plate_map.COLUMNS)
+        by_column.setdefault(column, {})[row] = (kind, source)
+
+    columns = []
+    for column, sources in sorted(by_column.items()):
+        if len(sources) < plate_map.ROWS:
+            continue
+        if any(kind != 'sample' for kind, _ in sources.values()):
+            continue
+        source_columns = {source // plate_map.ROWS for _, source in sources.values()}
+        if len(source_columns) == 1 and all(
+                source % plate_map.ROWS == row
+                for row, (_, source) in sources.items()):
+            columns.append((source_columns.pop(), column))
+
+    done = {column for _, column in columns}
+    rest = [
+        (source, well) for source, well in plan.samples
+        if well % plate_map.COLUMNS not in done]
+    return columns, rest
+
+
+def serpentine(wells):
+    """Order wells row by row, reversing every other row, so each move is to a neighbour."""
+    def key(well):
+        row, column = divmod(well, plate_map.COLUMNS)
+        return row, column if row % 2 == 0 else -column
+    return sorted(wells, key=key)
+
+
+def aliquots_per_trip(volume, max_volume, disposal_volume):
+    return max(1, int((max_volume - disposal_volume) // volume))
+
+
+def distribution_trips(wells, per_trip):
+    """Split wells, in travel order, into one list per aspirate."""
+    wells = serpentine(wells)
+    return [wells[i:i + per_trip] for i in range(0, len(wells), per_trip)]
+
+
+def master_mix_moves(plan, per_trip=1):
+    """How many times the pipette moves to a well to distribute the master mixes.
+
+    One transfer per well is an aspirate, a dispense and a blow-out.  A
+    distribution trip is an aspirate, a dispense per aliquot and a blow-out
+    of the disposal volume back into the source.  Each mix also picks up and
+    drops one tip either way.
+    """
+    moves = 2 * len(plan.master_mix)
+    for wells in plan.master_mix.values():
+        if per_trip == 1:
+            moves += 3 * len(wells)
+        else:
+            moves += sum(len(trip) + 2 for trip in distribution_trips(wells, per_trip))
+    return moves
+
+
+def transfer_with_primitives(p, source, dest, volume, mix=19, tip=None):
+    p.pick_up_tip(tip)
+
+    p.aspirate(1, source)
+    for _ in range(2):
+        p.aspirate(mix, source)
+        p.dispense(mix, source)
+
+    p.aspirate(volume - 1, source)
+    p.dispense(volume - 1, dest)
+
+    for _ in range(2):
+        p.aspirate(mix, dest)
+        p.dispense(mix, dest)
+
+    p.dispense(1, dest)
+    p.blow_out(dest.top())
+    p.air_gap(3, -1)
+    p.drop_tip()
+
+
+def distribute_master_mix(protocol, layout, plan, reagent_rack, plate_wells):
+    tip_rack = protocol.load_labware(
+        layout['MASTER_MIX_TIP_RACK'], layout['MASTER_MIX_TIP_LOCATION'])
+    pipette = protocol.load_instrument(
+        layout['MASTER_MIX_PIPETTE'], layout['MASTER_MIX_PIPETTE_MOUNT'],
+        tip_racks=[tip_rack])
+
+    volume = layout['MIX_VOLUME']
+    disposal = layout['DISPOSAL_VOLUME']
+    per_trip = aliquots_per_trip(
+        volume, layout['MASTER_MIX_MAX_VOLUME'], disposal)
+    protocol.comment(
+        'Distributing master mix, {} aliquots per aspirate: {} pipette moves '
+        'instead of {}.'.format(
+            per_trip, master_mix_moves(plan, per_trip), master_mix_moves(plan)))
+
+    for mix, wells in plan.master_mix.items():
+        source = reagent_rack[layout['REAGENT_LOCATIONS'][mix]]
+        pipette.pick_up_tip()
+        for trip in distribution_trips(wells, per_trip):
+            pipette.aspirate(volume * len(trip) + disposal, source)
+            for well in trip:
+                pipette.dispense(volume, plate_wells[well])
+            # The tip has only touched empty wells, so the disposal volume
+            # can go back into the master mix tube.
+            pipette.blow_out(source.top())
+        pipette.drop_tip()
+
+
+def transfer_columns(protocol, layout, plan, elution_plate, tempplate):
+    """Do the whole-column sample transfers; return the ones left for the p20."""
+    columns, rest = column_transfers(plan)
+    protocol.comment(
+        'Transferring {} whole columns with the 8-channel and {} samples one '
+        'at a time: {} tip pick-ups instead of {}.'.format(
+            len(columns), len(rest), len(columns) + len(rest),
+            len(plan.samples)))
+    if not columns:
+        return rest
+
+    multi_tip_racks = [
+        protocol.load_labware('opentrons_96_filtertiprack_20ul', s)
+        for s in layout['MULTI_TIP_LOCATIONS']]
+    m20 = protocol.load_instrument(
+        layout['MULTI_PIPETTE'], layout['MULTI_PIPETTE_MOUNT'],
+        tip_racks=multi_tip_racks)
+    m20.flow_rate.aspirate = 10
+    m20.flow_rate.dispense = 15
+    m20.flow_rate.blow_out = 50
+
+    for source_column, dest_column in columns:
+        transfer_with_primitives(
+            m20, elution_plate.columns()[source_column][0],
+            tempplate.columns()[dest_column][0], layout['SAMPLE_VOLUME'])
+    return rest
+
+
+def optimise_route(protocol, tip_racks, transfers):
+    """Reorder (source, dest) well pairs for the tips they will use.
+
+    Returns the reordered transfers and the tip for each one.
+    """
+    tips = [
+        tip for rack in tip_racks for tip in rack.wells()
+        if tip.has_tip][:len(transfers)]
+    if len(tips) < len(transfers):
+        # Not enough tips to plan the whole run; leave it as it is.
+        return transfers, [None] * len(transfers)
+
+    def xy(well):
+        point = well.top().point
+        return point.x, point.y
+
+    order, saved = routing.optimise_transfers(
+        [xy(tip) for tip in tips],
+        [(xy(source), xy(dest)) for source, dest in transfers],
+        xy(protocol.fixed_trash['A1']))
+    protocol.comment(
+        'Optimised sample transfer route: {:.0f} mm less gantry travel, '
+        'about {:.0f} seconds.'.format(saved, saved / routing.XY_SPEED))
+    return [transfers[i] for i in order], tips
+
+
+def check_mounts(layout):
+    """Raise ValueError if the layout loads two pipettes on one mount."""
+    if layout['SAMPLE_MULTICHANNEL'] and layout['MASTER_MIX_DISTRIBUTE'] and (
+            layout['MULTI_PIPETTE_MOUNT'] == layout['MASTER_MIX_PIPETTE_MOUNT']):
+        raise ValueError(
+            'SAMPLE_MULTICHANNEL and MASTER_MIX_DISTRIBUTE both need the {} '
+            'mount'.format(layout['MULTI_PIPETTE_MOUNT']))
+
+
+def run(protocol, constants):
+    layout = dict(DEFAULTS)
+    layout.update(constants)
+    # Before any liquid handling, so a bad layout doesn't waste a plate of
+    # master mix first.
+    check_mounts(layout)
+
+    plan = compile_plan(
+        layout['MASTER_MIX_MAP'], layout['SAMPLE_MAP'],
+        layout['REAGENT_LOCATIONS'])
+
+    sample_tip_racks = [
+        protocol.load_labware(
+            'opentrons_96_filtertiprack_20ul', s)
+        for s in layout['SAMPLE_TIP_LOCATIONS']]
+    p20 = protocol.load_instrument(
+        'p20_single_gen2', 'right', tip_racks=sample_tip_racks)
+
+    tempdeck = protocol.load_module('tempdeck', layout['TEMPDECK_SLOT'])
+    tempdeck.set_temperature(layout['TEMPERATURE'])
+
+    tempplate = tempdeck.load_labware(layout['QPCR_LABWARE'])
+
+    tempplate_wells_by_row = list(itertools.chain(*tempplate.rows()))
+
+    reagent_rack = protocol.load_labware(
+        layout['REAGENT_RACK_LABWARE'], layout['REAGENT_RACK_SLOT'])
+
+    elution_plate = protocol.load_labware(
+        layout['ELUTION_LABWARE'], '1', layout['ELUTION_LABWARE_NAME'])
+
+    p20.flow_rate.aspirate = 10
+    p20.flow_rate.dispense = 15
+    p20.flow_rate.blow_out = 50
+
+    # Distribute master mixes, using a single tip for each
+    if layout['MASTER_MIX_DISTRIBUTE']:
+        distribute_master_mix(protocol, layout, plan, reagent_rack, tempplate_wells_by_row)
+    else:
+        for mix, wells in plan.master_mix.items():
+            p20.pick_up_tip()
+            for well in wells:
+                dest = tempplate_wells_by_row[well]
+                p20.transfer(
+                    layout['MIX_VOLUME'],
+                    reagent_rack[layout['REAGENT_LOCATIONS'][mix]],
+                    dest, new_tip='never')
+                p20.blow_out(dest.top())
+            p20.drop_tip()
+
+    # Transfer the samples and controls, every transfer with its own tip.
+    # Transfers are made row by row, left to right, unless we optimise the
+    # route.
+    samples = plan.samples
+    if layout['SAMPLE_MULTICHANNEL']:
+        samples = transfer_columns(protocol, layout, plan, elution_plate, tempplate)
+
+    transfers = [
+        (elution_plate.wells()[source] if kind == 'sample' else reagent_rack[source],
+         tempplate_wells_by_row[well])
+        for (kind, source), well in samples]
+    tips = [None] * len(transfers)
+    if layout['OPTIMISE_ROUTE']:
+        transfers, tips = optimise_route(protocol, sample_tip_racks, transfers)
+
+    for (source_well, dest_well), tip in zip(transfers, tips):
+        transfer_with_primitives(
+            p20, source_well, dest_well, layout['SAMPLE_VOLUME'], tip=tip)
+
+
+def load_layout(path):
+    """Read a Station C layout file's constants without running it."""
+    with open(path, encoding='utf-8') as f:
+        source = f.read()
+    constants = {}
+    exec(compile(source, path, 'exec', dont_inherit=True), constants)
+    layout = dict(DEFAULTS)
+    layout.update(
+        (name, value) for name, value in constants.items() if name.isupper())
+    return layout
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Summarise the transfer plan of a Station C layout file.')
+    parser.add_argument('file', help='A Station C layout, such as protocols/station-C-qpcr-map.py.')
+    args = parser.parse_args()
+
+    layout = load_layout(args.file)
+    plan = compile_plan(
+        layout['MASTER_MIX_MAP'], layout['SAMPLE_MAP'],
+        layout['REAGENT_LOCATIONS'])
+    reactions = sum(len(wells) for wells in plan.master_mix.values())
+    per_trip = aliquots_per_trip(
+        layout['MIX_VOLUME'], layout['MASTER_MIX_MAX_VOLUME'],
+        layout['DISPOSAL_VOLUME'])
+    print(f'{reactions} reactions, {len(plan.master_mix)} master mixes, {len(plan.samples)} sample transfers')
+    print(f'Master mix pipette moves: {master_mix_moves(plan)} transferring, '
+          f'{master_mix_moves(plan, per_trip)} distributing {per_trip} aliquots per aspirate')
+    columns, rest = column_transfers(plan)
+    print(f'Sample tip pick-ups: {len(plan.samples)} single-channel, '
+          f'{len(columns) + len(rest)} with {len(columns)} whole columns on an 8-channel')
+
+
+if __name__ == '__main__':
+    main()
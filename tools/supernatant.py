@@ -0,0 +1,115 @@
+"""Remove supernatant in as few trips to the waste as the tip allows.
+
+Protocol scripts import this module, so it must be importable on the robot
+as well as in simulation (see the README).
+
+The Zymo Station B scripts removed supernatant 180 uL at a time from a
+300 uL tip, so 495 uL took three trips to the waste where two would do.
+SupernatantRemoval.trips() splits what is to be removed (everything but
+residual uL) into the fewest equal trips that fit in capacity uL with the
+air gap, and remove() makes them.  Equal trips keep the tip clear of the
+pellet for as long as possible.
+
+The air gap is taken either at the source, after the supernatant, so
+nothing drips on the way to the waste (like transfer(air_gap=...) does),
+or at the waste after each trip but the last, so nothing drips on the way
+back over the samples.  A waste-side gap stays in the tip for the next
+aspirate, so there is no blow-out until the last trip.
+
+Each remove() is charged to a named stage, and report() comments how many
+trips per column each stage took against the old fixed-size trips.  Only
+travel is saved: the plunger moves the same volume either way.  For the
+time that saves, compare the scripts' estimates with tools/runtime.py.
+
+    remover = SupernatantRemoval(
+        protocol, p300, capacity=270, air_gap=10, baseline_trip=180)
+    ...
+    remover.remove('Wash 1', well.bottom(0.5), waste, 495)
+    ...
+    remover.report()
+"""
+
+import math
+from collections import OrderedDict
+
+
+class SupernatantRemoval:
+    """Removes supernatant with one pipette.
+
+    capacity defaults to what both the pipette and its tips hold, so a
+    P300 with 200 uL filter tips takes 200 uL.  baseline_trip is the old
+    volume per trip, or a function giving the old number of trips for a
+    volume, for the report.
+    """
+
+    def __init__(self, protocol, pipette, capacity=None, air_gap=10,
+                 residual=0, air_gap_at_waste=True, baseline_trip=180):
+        self._protocol = protocol
+        self._pipette = pipette
+        if capacity is None:
+            capacity = pipette.max_volume
+            if pipette.tip_racks:
+                capacity = min(
+                    capacity, pipette.tip_racks[0].wells()[0].max_volume)
+        self.capacity = capacity
+        self.air_gap = air_gap
+        self.residual = residual
+        self.air_gap_at_waste = air_gap_at_waste
+        self.baseline_trip = baseline_trip
+        # {stage: [columns, trips, baseline trips]}
+        self.stages = OrderedDict()
+
+    def trips(self, volume, residual=None):
+        """The volume to aspirate on each trip, leaving residual uL behind."""
+        if residual is None:
+            residual = self.residual
+        volume = max(0, volume - residual)
+        if not volume:
+            return []
+        count = math.ceil(volume / (self.capacity - self.air_gap))
+        return [volume / count] * count
+
+    def remove(self, stage, source, waste, volume, residual=None,
+               approach=None):
+        """Take volume from the source location to waste.
+
+        If approach is given the pipette moves there before each aspirate,
+        e.g. to the centre of the well so the tip comes down clear of the
+        pellet.
+        """
+        pipette = self._pipette
+        trips = self.trips(volume, residual)
+        for i, trip in enumerate(trips):
+            if approach is not None:
+                pipette.move_to(approach)
+            pipette.aspirate(trip, source)
+            if not self.air_gap_at_waste:
+                pipette.air_gap(self.air_gap)
+            pipette.dispense(pipette.current_volume, waste)
+            if not self.air_gap_at_waste:
+                pipette.blow_out(waste)
+            elif i < len(trips) - 1:
+                pipette.aspirate(self.air_gap, waste)
+        if trips and self.air_gap_at_waste:
+            pipette.blow_out(waste)
+
+        removed = sum(trips)
+        totals = self.stages.setdefault(stage, [0, 0, 0])
+        totals[0] += 1
+        totals[1] += len(trips)
+        if callable(self.baseline_trip):
+            totals[2] += self.baseline_trip(removed)
+        else:
+            totals[2] += math.ceil(removed / self.baseline_trip)
+
+    def report(self):
+        saved = 0
+        for stage, (columns, trips, baseline) in self.stages.items():
+            saved += baseline - trips
+            self._protocol.comment(
+                'Supernatant removal for {}: {:.1f} trips per column instead '
+                'of {:.1f}.'.format(
+                    stage, trips / columns, baseline / columns))
+        self._protocol.comment(
+            'Supernatant removal made {} fewer trips to the waste in '
+            'all.'.format(saved))
@@ -0,0 +1,121 @@
+"""Compare batch sizes of a protocol that takes its sample count as NUM_SAMPLES.
+
+We used to keep a copy of each station script per batch size.  Scripts with
+a NUM_SAMPLES constant, such as StationA-Zymo-M.py, Station_AB_Zymo.py and
+the S2-S5 scripts, cover any count instead.  This simulates each one at
+several counts and reports, for each count, the estimated run time, samples
+per hour (including the operator's time to load the robot between runs)
+and tips per sample, marking the count with the best throughput.  Each
+script raises ValueError for a count it can't process, rather than quietly
+doing fewer samples, and that count is reported as not supported.
+
+Usage:
+
+    python tools/sweep.py                       # every NUM_SAMPLES script
+    python tools/sweep.py protocols/S3/v1_station_b_S3.ot2.apiv2.py --counts 24 48 96
+    python tools/sweep.py Station_AB_Zymo.py --write generated/
+
+--write saves a copy of each script with NUM_SAMPLES set to each count,
+ready to upload to a robot.
+"""
+
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+
+import runtime
+import simulation
+
+NUM_SAMPLES_PATTERN = re.compile(r"^NUM_SAMPLES = [0-9]+$", re.MULTILINE)
+# Only the S2-S5 Station B scripts take 96, and the S2-S4 Station C ones
+# at most 30 (46 with two mastermixes).
+DEFAULT_COUNTS = [8, 16, 24, 30, 48, 96]
+
+# Set in each worker process by init_worker().
+LABWARE = None
+
+
+def is_parameterised(path):
+    with open(path, encoding="utf-8") as f:
+        return NUM_SAMPLES_PATTERN.search(f.read()) is not None
+
+
+def generate(path, count):
+    """The source of the script at path with NUM_SAMPLES set to count."""
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    return NUM_SAMPLES_PATTERN.sub(f"NUM_SAMPLES = {count}", source, count=1)
+
+
+def simulate_count(job):
+    path, count = job
+    counter = simulation.CommandCounter()
+    estimator = runtime.RuntimeEstimator()
+    try:
+        simulation.simulate(path, labware=LABWARE, observers=[counter, estimator], constants={"NUM_SAMPLES": count})
+    except ValueError as e:
+        # How the scripts reject a count; see the module docstring.
+        if not counter.steps:
+            return path, count, None, None, f"not supported ({e})"
+        return path, count, None, None, f"doesn't run (ValueError: {e})"
+    except Exception as e:
+        return path, count, None, None, f"doesn't run ({type(e).__name__}: {e})"
+    return path, count, estimator.seconds, counter.tips, None
+
+
+def init_worker(labware):
+    global LABWARE
+    LABWARE = labware
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate protocols with a NUM_SAMPLES constant at several sample counts and compare their throughput.")
+    parser.add_argument("paths", nargs="*", help="Protocol files.  Defaults to every protocol in protocols/ with a NUM_SAMPLES constant.")
+    parser.add_argument("--counts", type=int, nargs="+", default=DEFAULT_COUNTS, help="Sample counts to try.")
+    parser.add_argument("--reload-minutes", type=float, default=10, help="Operator time to load the robot between runs, counted against throughput.")
+    parser.add_argument("--write", metavar="DIR", help="Also write a copy of each protocol for each count into DIR.")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Number of worker processes.  Defaults to one per core.")
+    args = parser.parse_args()
+
+    paths = [os.path.abspath(p) for p in args.paths]
+    if not paths:
+        paths = [p for p in simulation.find_protocols(simulation.PROTOCOL_DIRS[:1]) if is_parameterised(p)]
+    unparameterised = [p for p in paths if not is_parameterised(p)]
+    if unparameterised:
+        parser.error(f"No NUM_SAMPLES constant in {', '.join(unparameterised)}")
+
+    if args.write:
+        os.makedirs(args.write, exist_ok=True)
+        for path in paths:
+            name, extension = os.path.splitext(simulation.output_name(path, ".py"))
+            for count in args.counts:
+                with open(os.path.join(args.write, f"{name}-{count}samples{extension}"), "w", encoding="utf-8") as f:
+                    f.write(generate(path, count))
+
+    jobs = [(path, count) for path in paths for count in args.counts]
+    results = {}
+    with multiprocessing.Pool(args.jobs, init_worker, (simulation.load_labware_definitions(),)) as pool:
+        for path, count, seconds, tips, error in pool.imap_unordered(simulate_count, jobs):
+            results[path, count] = seconds, tips, error
+
+    for path in paths:
+        print(os.path.relpath(path, simulation.REPO_ROOT))
+        rates = {}
+        for count in args.counts:
+            seconds, tips, error = results[path, count]
+            if error:
+                print(f"  {count:3} samples: {error}")
+                continue
+            rates[count] = count / ((seconds + 60 * args.reload_minutes) / 3600)
+            print(f"  {count:3} samples: {runtime.format_seconds(seconds)}, "
+                  f"{rates[count]:5.1f} samples/hour, {tips / count:.2f} tips/sample")
+        if rates:
+            best = max(rates, key=rates.get)
+            print(f"  Best throughput: {best} samples per run.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""Remember which tips are used on each rack from one run to the next.
+
+Protocol scripts import this module, so it must be importable on the robot
+as well as in simulation (see the README).
+
+Our scripts assume every tip rack starts full, so a rack left half used at
+the end of a run is either thrown out or refilled by hand.  A TipLedger
+keeps a JSON file on the robot listing the used tips of each rack, keyed by
+slot and labware type.  Racks loaded through the ledger start with those
+tips marked as used, so the next run carries on from the first fresh tip:
+
+    ledger = TipLedger(ctx, TIP_LEDGER_FILE, replaced=REPLACED_TIP_RACKS)
+    tips300 = [ledger.load_rack('opentrons_96_filtertiprack_200ul', slot)
+               for slot in ['3', '6']]
+    m300 = ctx.load_instrument('p300_multi', 'left', tip_racks=tips300)
+    ...
+    ledger.pick_up_tip(m300)
+
+When the operator puts fresh racks on the deck they list those slots in
+replaced (or pass replaced='all'), and the ledger forgets those racks'
+history.  If a pipette's racks run out mid-run, pick_up_tip() pauses for
+new racks as the scripts used to, and records them as fresh.
+
+This only suits scripts that take the next fresh tip each time.  Scripts
+that assign each step its own tip columns and return tips to reuse them,
+like the Zymo Station B scripts, need full racks; checkpoint.py keeps
+track of their tips across an interrupted run instead.
+
+Simulating a protocol never writes the ledger file: the OT-2 app simulates
+every protocol when it is uploaded, and that mustn't use up any tips.
+"""
+
+import json
+import os
+
+ALL_RACKS = 'all'
+
+
+class TipLedger:
+    def __init__(self, protocol, path, replaced=()):
+        self._protocol = protocol
+        self._path = path
+        self._racks = {}
+        self.used = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.used = json.load(f)
+        self._replaced = replaced
+
+    @staticmethod
+    def key(load_name, slot):
+        return '{} in slot {}'.format(load_name, slot)
+
+    def load_rack(self, load_name, slot, label=None):
+        """Load a tip rack, marking the tips earlier runs used."""
+        rack = self._protocol.load_labware(load_name, slot, label)
+        key = self.key(load_name, slot)
+        self._racks[key] = rack
+        if self._replaced == ALL_RACKS or str(slot) in self._replaced:
+            self.used.pop(key, None)
+        for name in self.used.get(key, []):
+            rack.use_tips(rack[name])
+        remaining = sum(well.has_tip for well in rack.wells())
+        if remaining < len(rack.wells()):
+            self._protocol.comment(
+                'Tip rack in slot {} has {} tips left from earlier runs.'.format(
+                    slot, remaining))
+        return rack
+
+    def starting_tip(self, pipette):
+        """The first tip the pipette can pick up from its racks, or None."""
+        for rack in pipette.tip_racks:
+            tip = rack.next_tip(pipette.channels)
+            if tip is not None:
+                return tip
+        return None
+
+    def pick_up_tip(self, pipette):
+        """Pick up the next fresh tip, pausing for new racks if there are none."""
+        tip = self.starting_tip(pipette)
+        if tip is None:
+            self._protocol.pause(
+                'Replace {}µl tipracks before resuming.'.format(
+                    pipette.max_volume))
+            pipette.reset_tipracks()
+            tip = self.starting_tip(pipette)
+        pipette.starting_tip = tip
+        pipette.pick_up_tip()
+        self.save()
+
+    def save(self):
+        """Record which tips are used on every rack loaded through the ledger."""
+        for key, rack in self._racks.items():
+            self.used[key] = [
+                well.display_name.split(' ')[0]
+                for well in rack.wells() if not well.has_tip]
+        if self._protocol.is_simulating():
+            return
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = self._path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(self.used, f, indent=2)
+        # Atomic, so a crash while saving leaves the previous ledger.
+        os.replace(temporary, self._path)
@@ -0,0 +1,232 @@
+"""Plan when a transfer list needs a new tip, and show the plan is safe.
+
+Tips are our biggest consumable cost, and the scripts already reuse them
+where they know it's safe: Station C uses one tip per master mix, and
+Station A one p20 tip for all its proteinase K additions.  This module
+works out where reuse is safe for any list of transfers, and writes down
+why, so the reasoning can be checked instead of trusted.
+
+The model: every well has a set of materials in it.  A source well that
+nothing is transferred into starts with a material of its own (its name),
+and so do the filled wells, such as sample wells that get a reagent added.
+A tip picks up the materials of every well it aspirates from, and of every
+well it dispenses into while touching the liquid.  A transfer's destination
+gets everything the tip carries.  A well may only ever receive the
+materials the transfer list means it to have: its own, plus those of every
+well that transfers into it, directly or through other wells.  So a
+shared reagent only ever holds that reagent, and no sample reaches another
+sample's well.
+
+plan() walks the transfers in order and changes tip only when entering the
+next well with the current tip would break that rule.  This is greedy, not
+guaranteed minimal: a tip kept longer can leave a well holding more of
+what it may hold, and a later tip then picks that up too, so an earlier
+change occasionally saves two later ones.  The proof is that the plan is
+safe, not that it is the best: the walk itself, with what the tip carries
+and what the well may receive at every step.  verify() replays a schedule
+from scratch.
+
+Usage: python tools/tip_planner.py transfers.csv [--filled WELL ...], with
+source, dest and optional touch (0 or 1, default 1) columns; or
+--stationc layout.py for a Station C layout's master mix and sample
+transfers.
+"""
+
+import argparse
+import csv
+import sys
+
+import plate_map
+import stationc
+
+
+class Transfer:
+    def __init__(self, source, dest, touch=True):
+        self.source = source
+        self.dest = dest
+        # Whether the tip touches the destination's liquid.  Dispensing from
+        # above an empty well, or from the top of a well, doesn't.
+        self.touch = touch
+
+    def __repr__(self):
+        return '{} -> {}'.format(self.source, self.dest)
+
+
+def initial_contents(transfers, filled=()):
+    """{well: the materials in it before the first transfer}."""
+    destinations = {t.dest for t in transfers} - set(filled)
+    contents = {}
+    for t in transfers:
+        for well in (t.source, t.dest):
+            contents[well] = set() if well in destinations else {well}
+    return contents
+
+
+def allowed_materials(transfers, filled=()):
+    """{well: the materials it may ever hold}."""
+    allowed = initial_contents(transfers, filled)
+    changed = True
+    while changed:
+        changed = False
+        for t in transfers:
+            if not allowed[t.source] <= allowed[t.dest]:
+                allowed[t.dest] |= allowed[t.source]
+                changed = True
+    return allowed
+
+
+class Schedule:
+    """Which transfers share a tip, and the step-by-step proof."""
+
+    def __init__(self, transfers, tips, proof):
+        self.transfers = transfers
+        # tips[k] is the list of transfer indexes done with the k-th tip.
+        self.tips = tips
+        self.proof = proof
+
+    def report(self, proof=False):
+        lines = [
+            '{} transfers, {} tips ({} saved on a new tip per transfer).'.format(
+                len(self.transfers), len(self.tips),
+                len(self.transfers) - len(self.tips)),
+            '',
+        ]
+        for k, indexes in enumerate(self.tips, 1):
+            lines.append('Tip {}: {}'.format(
+                k, ', '.join(repr(self.transfers[i]) for i in indexes)))
+        if proof:
+            lines += ['', 'Proof:'] + self.proof
+        return '\n'.join(lines)
+
+
+def _names(materials):
+    return '{' + ', '.join(sorted(materials)) + '}'
+
+
+class _Walk:
+    """Follows the tip and the wells' contents through a run."""
+
+    def __init__(self, transfers, filled):
+        self.allowed = allowed_materials(transfers, filled)
+        self.contents = initial_contents(transfers, filled)
+        self.carried = set()
+
+    def unsafe(self, well):
+        """The materials the tip would wrongly bring into well."""
+        return self.carried - self.allowed[well]
+
+    def do(self, t):
+        self.contents[t.source] |= self.carried
+        self.carried |= self.contents[t.source]
+        if t.touch:
+            self.carried |= self.contents[t.dest]
+        self.contents[t.dest] |= self.carried
+
+
+def plan(transfers, filled=()):
+    """A safe Schedule for transfers, in order, changing tip only when needed.
+
+    filled names destination wells that already hold something of their own.
+    """
+    transfers = list(transfers)
+    walk = _Walk(transfers, filled)
+    tips = []
+    proof = []
+    for i, t in enumerate(transfers):
+        source_problem = walk.unsafe(t.source)
+        if tips and not source_problem:
+            # The source is fine; check the destination after aspirating.
+            carried = walk.carried | walk.contents[t.source]
+            dest_problem = carried - walk.allowed[t.dest]
+        else:
+            dest_problem = set()
+        if not tips or source_problem or dest_problem:
+            if tips:
+                well, problem = (t.source, source_problem) if source_problem else (t.dest, dest_problem)
+                proof.append('  new tip: {} may only hold {}, but the tip carries {}.'.format(
+                    well, _names(walk.allowed[well]), _names(problem)))
+            walk.carried = set()
+            tips.append([])
+        before = _names(walk.carried)
+        walk.do(t)
+        tips[-1].append(i)
+        proof.append('{:4} tip {}: {}: tip carried {}, {} may hold {}, {} may hold {}.'.format(
+            i + 1, len(tips), t, before,
+            t.source, _names(walk.allowed[t.source]),
+            t.dest, _names(walk.allowed[t.dest])))
+    return Schedule(transfers, tips, proof)
+
+
+def verify(transfers, tips, filled=()):
+    """Raise ValueError if a tip schedule ever puts a material where it doesn't belong."""
+    transfers = list(transfers)
+    order = [i for indexes in tips for i in indexes]
+    if order != list(range(len(transfers))):
+        raise ValueError('The schedule must do every transfer once, in order')
+    walk = _Walk(transfers, filled)
+    for indexes in tips:
+        walk.carried = set()
+        for i in indexes:
+            t = transfers[i]
+            for well, carried in (
+                    (t.source, walk.carried),
+                    (t.dest, walk.carried | walk.contents[t.source])):
+                problem = carried - walk.allowed[well]
+                if problem:
+                    raise ValueError('Transfer {} ({}) brings {} into {}'.format(
+                        i + 1, t, _names(problem), well))
+            walk.do(t)
+
+
+def read_transfers(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return [
+            Transfer(row['source'], row['dest'], row.get('touch', '1').strip() not in ('0', ''))
+            for row in csv.DictReader(f)]
+
+
+def stationc_transfers(layout):
+    """The transfers a Station C layout does, in the order stationc.run() does them."""
+    plan = stationc.compile_plan(
+        layout['MASTER_MIX_MAP'], layout['SAMPLE_MAP'],
+        layout['REAGENT_LOCATIONS'])
+    transfers = []
+    for mix, wells in plan.master_mix.items():
+        for well in wells:
+            # Master mix goes into empty wells first.
+            transfers.append(Transfer(
+                'tube ' + layout['REAGENT_LOCATIONS'][mix],
+                'qPCR ' + plate_map.well_name(well), touch=False))
+    for (kind, source), well in plan.samples:
+        if kind == 'sample':
+            # The elution plate is in wells() order, down each column.
+            column, row = divmod(source, plate_map.ROWS)
+            source = 'elution {}{}'.format(plate_map.ROW_NAMES[row], column + 1)
+        else:
+            source = 'tube ' + source
+        # Samples are mixed into the master mix.
+        transfers.append(Transfer(source, 'qPCR ' + plate_map.well_name(well)))
+    return transfers
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Plan tip changes for a transfer list that never contaminate a well, with a proof that they are safe.  The plan is greedy, not guaranteed minimal.')
+    parser.add_argument('file', help='A CSV file of transfers, or with --stationc a Station C layout.')
+    parser.add_argument('--stationc', action='store_true', help='Read the transfers from a Station C layout file.')
+    parser.add_argument('--filled', nargs='+', default=[], metavar='WELL', help='Destination wells that already hold something of their own, like samples.')
+    parser.add_argument('--proof', action='store_true', help='Print the step-by-step proof that the schedule is safe.')
+    args = parser.parse_args()
+
+    if args.stationc:
+        transfers = stationc_transfers(stationc.load_layout(args.file))
+    else:
+        transfers = read_transfers(args.file)
+    schedule = plan(transfers, args.filled)
+    verify(transfers, schedule.tips, args.filled)
+    print(schedule.report(args.proof))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
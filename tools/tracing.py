@@ -0,0 +1,232 @@
+"""Record how long each phase and each pipette command of a run really takes.
+
+Protocol scripts import this module, so it must be importable on the robot
+as well as in simulation (see the README).
+
+Our scripts mark their phases with protocol.comment(), and runtime.py
+estimates each phase's duration from a simulation, but nothing measured
+real runs.  A Tracer listens to the protocol's commands, like the
+simulation observers do, and appends a JSON line to a file for each span:
+
+    {"run": ..., "span": "run", "protocol": ..., "started": ..., "simulated": false}
+    {"run": ..., "span": "command", "name": "aspirate", "phase": ..., "text": ..., "start": 12.31, "seconds": 1.84}
+    {"run": ..., "span": "phase", "name": "Removing supernatant:", "start": 9.02, "seconds": 213.7}
+    {"run": ..., "span": "end", "seconds": 5361.2}
+
+start is seconds since the run began.  A phase runs from its comment to the
+next one, as in runtime.py, and commands before the first comment are in
+'Setup'.  Each line is flushed as it is written, so an aborted run keeps
+everything up to the command it stopped in.  Commands that only wrap others
+(transfer, mix...) aren't recorded; their aspirates and dispenses are.
+
+In a protocol:
+
+    tracer = trace(protocol, TRACE_FILE, metadata['protocolName'])
+    try:
+        ...
+    finally:
+        tracer.close()
+
+Like the checkpoint file, the trace is not written when the protocol is
+only being simulated, because the OT-2 app simulates every protocol when
+it is uploaded.  Instead, running this module simulates a protocol with a
+Tracer whose clock is runtime.py's estimate, so the spans are the same as a
+real run's, and compares them with a trace from the robot:
+
+    python tools/tracing.py protocol.py                   # estimated phases
+    python tools/tracing.py protocol.py trace.jsonl       # against a real run
+    python tools/tracing.py protocol.py --write sim.jsonl
+
+That needs the opentrons package, like the other offline tools.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from collections import OrderedDict
+
+# simulation.py only needs the opentrons package, which the robot has too.
+import simulation
+
+# Topic and names of the broker messages for commands (see
+# opentrons.commands.types).
+COMMAND_TOPIC = 'command'
+COMMENT = 'command.COMMENT'
+
+
+class Tracer:
+    """Broker observer that writes spans to path, or keeps them if it's None.
+
+    clock returns seconds; on the robot it's the wall clock.  If
+    unsubscribe is set, close() calls it to stop listening.
+    """
+
+    def __init__(self, path, protocol_name=None, simulated=False,
+                 clock=time.monotonic):
+        self._clock = clock
+        self._origin = clock()
+        self._stack = []
+        self._file = None
+        self.unsubscribe = None
+        # Unique even for runs started in the same second.
+        self.run = '{}-{}'.format(
+            time.strftime('%Y-%m-%dT%H:%M:%S'), uuid.uuid4().hex[:8])
+        self.phase = 'Setup'
+        self._phase_start = 0.0
+        self.records = []
+        if path is not None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(path, 'a')
+        self._write({
+            'span': 'run', 'protocol': protocol_name,
+            'started': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'simulated': simulated})
+
+    def now(self):
+        return self._clock() - self._origin
+
+    def _write(self, record):
+        record = dict(run=self.run, **record)
+        self.records.append(record)
+        if self._file is not None:
+            self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+
+    def _end_phase(self, now):
+        self._write({
+            'span': 'phase', 'name': self.phase, 'start': self._phase_start,
+            'seconds': now - self._phase_start})
+
+    def __call__(self, message):
+        name = message['name']
+        now = self.now()
+        if message['$'] == 'before':
+            if name == COMMENT:
+                self._end_phase(now)
+                self.phase = message['payload']['text']
+                self._phase_start = now
+            self._stack.append(now)
+            return
+        start = self._stack.pop()
+        if name == COMMENT or name in simulation.COMPOSITE_COMMANDS:
+            return
+        record = {
+            'span': 'command', 'name': name.split('.')[-1].lower(),
+            'phase': self.phase, 'text': message['payload'].get('text'),
+            'start': start, 'seconds': now - start}
+        if message.get('error') is not None:
+            record['error'] = str(message['error'])
+        self._write(record)
+
+    def close(self):
+        if self.unsubscribe is not None:
+            self.unsubscribe()
+            self.unsubscribe = None
+        now = self.now()
+        self._end_phase(now)
+        self._write({'span': 'end', 'seconds': now})
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def trace(protocol, path, protocol_name=None):
+    """Start tracing protocol's commands into path.
+
+    Call close() at the end, even if the run fails (try/finally): the robot
+    keeps one broker across runs, so a tracer left subscribed would keep
+    its file open and write the next run's commands under this run.
+    """
+    if protocol.is_simulating():
+        path = None
+    tracer = Tracer(path, protocol_name, protocol.is_simulating())
+    tracer.unsubscribe = protocol.broker.subscribe(COMMAND_TOPIC, tracer)
+    return tracer
+
+
+def read(path, run=None):
+    """The records of one run in a trace file: the last one, unless run is given."""
+    runs = OrderedDict()
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                runs.setdefault(record['run'], []).append(record)
+    if not runs:
+        raise ValueError('{} has no runs in it'.format(path))
+    if run is None:
+        run = list(runs)[-1]
+    return runs[run]
+
+
+def phase_seconds(records):
+    """{phase: seconds} for a run's records, summing phases that recur."""
+    phases = OrderedDict()
+    for record in records:
+        if record['span'] == 'phase':
+            phases[record['name']] = (
+                phases.get(record['name'], 0.0) + record['seconds'])
+    return phases
+
+
+def simulate(path, write=None):
+    """Trace a simulation of the protocol at path, timed by runtime.py."""
+    # Only the offline tool needs this.
+    import runtime
+
+    estimator = runtime.RuntimeEstimator()
+    name = simulation.load_protocol(path)['metadata'].get('protocolName')
+    tracer = Tracer(write, name, True, clock=lambda: estimator.seconds)
+
+    def observe(message):
+        # The tracer reads the clock before the estimator charges the command.
+        tracer(message)
+        estimator(message)
+
+    simulation.simulate(path, observers=[observe])
+    tracer.close()
+    return tracer.records
+
+
+def main():
+    import runtime
+
+    parser = argparse.ArgumentParser(description='Compare the estimated duration of each phase of a protocol with a trace of a real run.')
+    parser.add_argument('protocol', help='The protocol script.')
+    parser.add_argument('trace', nargs='?', help='A trace file from the robot.')
+    parser.add_argument('--run', help='Which run in the trace file to compare.  Defaults to the last one.')
+    parser.add_argument('--write', metavar='FILE', help='Also append the simulated trace to FILE.')
+    args = parser.parse_args()
+
+    estimated = phase_seconds(simulate(args.protocol, args.write))
+    if not args.trace:
+        for phase, seconds in estimated.items():
+            print('{:>8}  {}'.format(runtime.format_seconds(seconds), phase))
+        return 0
+
+    actual = phase_seconds(read(args.trace, args.run))
+    print('{:>8}  {:>8}  {:>8}  phase'.format('estimate', 'actual', 'lost'))
+    for phase in list(estimated) + [p for p in actual if p not in estimated]:
+        if phase not in actual:
+            print('{:>8}  {:>8}  {:>8}  {}'.format(
+                runtime.format_seconds(estimated[phase]), '-', '-', phase))
+            continue
+        expected = estimated.get(phase, 0.0)
+        print('{:>8}  {:>8}  {:>8}  {}'.format(
+            runtime.format_seconds(expected) if phase in estimated else '-',
+            runtime.format_seconds(actual[phase]),
+            runtime.format_seconds(actual[phase] - expected), phase))
+    print('{:>8}  {:>8}  {:>8}  in all'.format(
+        runtime.format_seconds(sum(estimated.values())),
+        runtime.format_seconds(sum(actual.values())),
+        runtime.format_seconds(sum(actual.values()) - sum(estimated.values()))))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())